@@ -206,8 +206,8 @@ class TestToolSingleOperation:
             })
 
             assert len(result) == 1
-            assert "Navigation successful" in result[0].message.text
-            assert "Example Domain" in result[0].message.text
+            assert "Navigation committed" in result[0].message.text
+            assert "example.com" in result[0].message.text
         finally:
             _invoke_with_retry(stop_tool, {
                 "provider": "hyperbrowser",
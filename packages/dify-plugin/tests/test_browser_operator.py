@@ -4,12 +4,13 @@ import ipaddress
 import sys
 from pathlib import Path
 from urllib.parse import urlparse
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 
 import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from dify_plugin.entities.tool import ToolInvokeMessage
 from playwright.sync_api import TimeoutError as PlaywrightTimeout
 
 from tools.browser_operator import (
@@ -18,14 +19,20 @@ from tools.browser_operator import (
     _pre_validate,
     _render_snapshot_node,
 )
-from utils.connection_pool import ConnectionNotFound, ConnectionUnhealthy
+from utils.connection_pool import (
+    ConnectionNotFound,
+    ConnectionPool,
+    ConnectionUnhealthy,
+    PageLoadTimeoutError,
+)
 
 VALID_CDP_URL = "ws://localhost:9222"
 
 
 def _setup_pool_mock(mock_pool: MagicMock, page: MagicMock) -> None:
-    """Configure a pool mock so that connect + get_page return the given page."""
+    """Configure a pool mock so that session and cdp_url lookups return the given page."""
     mock_pool.get_page.return_value = page
+    mock_pool.get_or_connect.return_value = page
 
 
 def _extract_message_url(message: str) -> str:
@@ -67,7 +74,7 @@ class TestTopLevelValidation:
 
     @patch("tools.browser_operator.pool")
     def test_cdp_connection_error_propagates(self, mock_pool, tool):
-        mock_pool.connect.side_effect = RuntimeError("refused")
+        mock_pool.get_or_connect.side_effect = RuntimeError("refused")
         result = list(tool._invoke({
             "cdp_url": VALID_CDP_URL,
             "action": "navigate",
@@ -166,9 +173,25 @@ class TestPreValidate:
 
     def test_actions_without_required_params_return_none(self):
         for action in ("snapshot", "go_back", "go_forward", "reload",
-                        "wait_navigation", "get_text", "get_html"):
+                        "wait_navigation", "get_text", "get_html", "screenshot"):
             assert _pre_validate(action, {}) is None, f"{action} should not require params"
 
+    def test_screenshot_rejects_unknown_image_format(self):
+        assert _pre_validate("screenshot", {"image_format": "gif"}) is not None
+
+    def test_screenshot_rejects_out_of_range_or_non_numeric_quality(self):
+        for quality in (0, 101, -5, "high", 72.5):
+            error = _pre_validate("screenshot", {"image_format": "jpeg", "quality": quality})
+            assert error is not None and "quality" in error
+
+    def test_screenshot_accepts_valid_or_missing_quality(self):
+        for quality in (None, "", 1, 100, "75", 80.0):
+            assert _pre_validate("screenshot", {"image_format": "jpeg", "quality": quality}) is None
+
+    def test_screenshot_png_ignores_quality(self):
+        for quality in (0, 101, "high"):
+            assert _pre_validate("screenshot", {"image_format": "png", "quality": quality}) is None
+
     def test_whitespace_selector_rejected(self):
         assert _pre_validate("click", {"selector": "   "}) is not None
 
@@ -220,11 +243,13 @@ class TestNavigateAction:
         }))
 
         assert len(result) == 1
-        assert "Navigation successful" in result[0].message.text
+        assert "Navigation committed" in result[0].message.text
         assert urlparse(_extract_message_url(result[0].message.text)).hostname == "example.com"
-        assert "Example Domain" in result[0].message.text
+        # The document may not have parsed at commit time, so no title is read.
+        assert "Title" not in result[0].message.text
+        page.title.assert_not_called()
         page.goto.assert_called_once_with(
-            "https://example.com", timeout=30000.0, wait_until="domcontentloaded"
+            "https://example.com", timeout=30000.0, wait_until="commit"
         )
 
     @patch("tools.browser_operator.pool")
@@ -242,7 +267,7 @@ class TestNavigateAction:
         }))
 
         page.goto.assert_called_once_with(
-            "https://slow.com", timeout=60000.0, wait_until="domcontentloaded"
+            "https://slow.com", timeout=60000.0, wait_until="commit"
         )
 
 
@@ -518,6 +543,25 @@ class TestGetTextAction:
 
         assert "No element found" in result[0].message.text
 
+    @patch("tools.browser_operator.PageLoadTimeoutError", PageLoadTimeoutError)
+    @patch("tools.browser_operator.pool")
+    def test_get_text_reports_page_load_stall(self, mock_pool, tool):
+        page = MagicMock()
+        page.inner_text.side_effect = PageLoadTimeoutError(
+            "Page did not reach DOMContentLoaded within 30000 ms of navigation start"
+        )
+        _setup_pool_mock(mock_pool, page)
+
+        result = list(tool._invoke({
+            "cdp_url": VALID_CDP_URL,
+            "action": "get_text",
+            "selector": "#price",
+        }))
+
+        assert "No element found" not in result[0].message.text
+        assert "PageLoadTimeoutError" in result[0].message.text
+        assert "wait_navigation" in result[0].message.text
+
 
 # ---------------------------------------------------------------------------
 # get_html
@@ -565,6 +609,25 @@ class TestGetHtmlAction:
 
         assert "No element found" in result[0].message.text
 
+    @patch("tools.browser_operator.PageLoadTimeoutError", PageLoadTimeoutError)
+    @patch("tools.browser_operator.pool")
+    def test_get_html_reports_page_load_stall(self, mock_pool, tool):
+        page = MagicMock()
+        page.inner_html.side_effect = PageLoadTimeoutError(
+            "Page did not reach DOMContentLoaded within 30000 ms of navigation start"
+        )
+        _setup_pool_mock(mock_pool, page)
+
+        result = list(tool._invoke({
+            "cdp_url": VALID_CDP_URL,
+            "action": "get_html",
+            "selector": "#price",
+        }))
+
+        assert "No element found" not in result[0].message.text
+        assert "PageLoadTimeoutError" in result[0].message.text
+        assert "wait_navigation" in result[0].message.text
+
 
 # ---------------------------------------------------------------------------
 # wait
@@ -757,7 +820,7 @@ class TestEdgeCases:
         }))
 
         page.goto.assert_called_once_with(
-            "https://example.com", timeout=30000.0, wait_until="domcontentloaded"
+            "https://example.com", timeout=30000.0, wait_until="commit"
         )
 
     def test_malformed_cdp_url_returns_error(self, tool):
@@ -771,6 +834,59 @@ class TestEdgeCases:
         assert "Error" in result[0].message.text
 
 
+class TestCdpUrlSharedSession:
+    @patch("tools.browser_operator.pool")
+    def test_calls_with_same_cdp_url_share_one_pooled_session(self, mock_pool, tool):
+        _setup_pool_mock(mock_pool, MagicMock())
+
+        for _ in range(2):
+            list(tool._invoke({"cdp_url": VALID_CDP_URL, "action": "go_back"}))
+
+        keys = {c.args[0] for c in mock_pool.get_or_connect.call_args_list}
+        assert len(keys) == 1
+        assert VALID_CDP_URL not in keys.pop()
+        mock_pool.get_or_connect.assert_called_with(ANY, VALID_CDP_URL)
+        mock_pool.disconnect.assert_not_called()
+
+    @patch("tools.browser_operator.pool")
+    def test_action_error_keeps_shared_worker(self, mock_pool, tool):
+        page = MagicMock()
+        page.go_back.side_effect = RuntimeError("net::ERR_ABORTED")
+        _setup_pool_mock(mock_pool, page)
+
+        result = list(tool._invoke({"cdp_url": VALID_CDP_URL, "action": "go_back"}))
+
+        assert "ERR_ABORTED" in result[0].message.text
+        mock_pool.disconnect.assert_not_called()
+
+    @patch("tools.browser_operator.pool")
+    def test_unhealthy_worker_drops_shared_session(self, mock_pool, tool):
+        mock_pool.get_or_connect.side_effect = ConnectionUnhealthy("pipe closed")
+
+        list(tool._invoke({"cdp_url": VALID_CDP_URL, "action": "go_back"}))
+
+        session_id = mock_pool.get_or_connect.call_args.args[0]
+        mock_pool.disconnect.assert_called_once_with(session_id)
+
+    @patch("tools.browser_operator.ConnectionUnhealthy", ConnectionUnhealthy)
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_disconnected_browser_is_replaced_on_next_call(self, MockWorker, tool):
+        # A worker whose browser dropped reports ConnectionUnhealthy and exits.
+        dropped, fresh = MagicMock(), MagicMock()
+        dropped.call.side_effect = ConnectionUnhealthy("Browser page lost")
+        fresh.call.return_value = "https://example.com"
+        MockWorker.side_effect = [dropped, fresh]
+
+        with patch("tools.browser_operator.pool", ConnectionPool()):
+            first = list(tool._invoke({"cdp_url": VALID_CDP_URL, "action": "go_back"}))
+            second = list(tool._invoke({"cdp_url": VALID_CDP_URL, "action": "go_back"}))
+
+        assert "Browser page lost" in first[0].message.text
+        assert "Navigated back" in second[0].message.text
+        assert MockWorker.call_count == 2
+        dropped.stop.assert_called_once()
+
+
 # ---------------------------------------------------------------------------
 # Session ID (connection pool) tests
 # ---------------------------------------------------------------------------
@@ -793,7 +909,7 @@ class TestSessionIdPath:
         }))
 
         assert len(result) == 1
-        assert "Navigation successful" in result[0].message.text
+        assert "Navigation committed" in result[0].message.text
         mock_pool.get_page.assert_called_once_with("sess-abc")
 
     @patch("tools.browser_operator.pool")
@@ -837,7 +953,7 @@ class TestSessionIdPath:
             "url": "https://example.com",
         }))
 
-        assert "Navigation successful" in result[0].message.text
+        assert "Navigation committed" in result[0].message.text
         mock_pool.connect.assert_called_once_with(
             "sess-missing", VALID_CDP_URL,
             provider_name="hyperbrowser",
@@ -859,7 +975,7 @@ class TestSessionIdPath:
             "action": "navigate",
             "url": "https://example.com",
         }))
-        assert "Navigation successful" in r1[0].message.text
+        assert "Navigation committed" in r1[0].message.text
 
         # Step 2: fill
         r2 = list(tool._invoke({
@@ -900,7 +1016,7 @@ class TestSnapshotAction:
     def test_snapshot_returns_accessibility_tree(self, mock_pool, tool):
         page = MagicMock()
         page.url = "https://example.com"
-        page.evaluate.return_value = {
+        page.snapshot.return_value = {
             "tree": {
                 "role": "generic",
                 "children": [
@@ -928,7 +1044,7 @@ class TestSnapshotAction:
     def test_snapshot_empty_page(self, mock_pool, tool):
         page = MagicMock()
         page.url = "about:blank"
-        page.evaluate.return_value = {"tree": None, "refCount": 0}
+        page.snapshot.return_value = {"tree": None, "refCount": 0}
         _setup_pool_mock(mock_pool, page)
 
         result = list(tool._invoke({"cdp_url": VALID_CDP_URL, "action": "snapshot"}))
@@ -940,7 +1056,7 @@ class TestSnapshotAction:
     def test_snapshot_via_session_id(self, mock_pool, tool):
         page = MagicMock()
         page.url = "https://example.com"
-        page.evaluate.return_value = {
+        page.snapshot.return_value = {
             "tree": {"role": "button", "name": "OK", "ref": "e1"},
             "refCount": 1,
         }
@@ -960,6 +1076,45 @@ class TestSnapshotAction:
         assert "snapshot" in _HANDLERS
 
 
+# ---------------------------------------------------------------------------
+# screenshot
+# ---------------------------------------------------------------------------
+
+
+class TestScreenshotAction:
+    @patch("tools.browser_operator.pool")
+    def test_screenshot_returns_png_blob(self, mock_pool, tool):
+        page = MagicMock()
+        page.url = "https://example.com"
+        page.screenshot.return_value = b"\x89PNG\r\n\x1a\n"
+        _setup_pool_mock(mock_pool, page)
+
+        result = list(tool._invoke({"cdp_url": VALID_CDP_URL, "action": "screenshot"}))
+
+        page.screenshot.assert_called_once_with(image_type="png", quality=None)
+        assert result[0].type == ToolInvokeMessage.MessageType.BLOB
+        assert result[0].message.blob == b"\x89PNG\r\n\x1a\n"
+        assert result[0].meta == {"mime_type": "image/png"}
+        assert "8 bytes" in result[1].message.text
+
+    @patch("tools.browser_operator.pool")
+    def test_screenshot_jpeg_with_quality(self, mock_pool, tool):
+        page = MagicMock()
+        page.url = "https://example.com"
+        page.screenshot.return_value = b"\xff\xd8\xff"
+        _setup_pool_mock(mock_pool, page)
+
+        result = list(tool._invoke({
+            "cdp_url": VALID_CDP_URL,
+            "action": "screenshot",
+            "image_format": "jpeg",
+            "quality": 60,
+        }))
+
+        page.screenshot.assert_called_once_with(image_type="jpeg", quality=60)
+        assert result[0].meta == {"mime_type": "image/jpeg"}
+
+
 # ---------------------------------------------------------------------------
 # _render_snapshot_node unit tests
 # ---------------------------------------------------------------------------
@@ -1027,3 +1182,11 @@ class TestRenderSnapshotNode:
     def test_no_ref_no_name(self):
         node = {"role": "generic"}
         assert _render_snapshot_node(node) == "- generic\n"
+
+    def test_deep_tree_does_not_recurse(self):
+        node = {"role": "button", "name": "Leaf", "ref": "e1"}
+        for _ in range(5000):
+            node = {"role": "group", "children": [node]}
+        output = _render_snapshot_node(node)
+        assert output.count("\n") == 5001
+        assert output.rstrip("\n").endswith('- button "Leaf" [ref=e1]')
@@ -1,6 +1,7 @@
 """Tests for the in-process subprocess-worker connection pool."""
 
 import sys
+import threading
 import time
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -13,6 +14,13 @@ from utils.connection_pool import (
     ConnectionNotFound,
     ConnectionPool,
     ConnectionUnhealthy,
+    PageLoadTimeoutError,
+    _decode_line,
+    _encode_line,
+    _PooledPageProxy,
+    _run_concurrently,
+    _StandbyWorkers,
+    _SubprocessWorker,
 )
 
 
@@ -21,7 +29,7 @@ def _make_mock_worker():
     worker = MagicMock()
     worker._proc = MagicMock()
     worker._proc.poll.return_value = None  # process is alive
-    worker.call.return_value = 1  # health check evaluate("1") returns 1
+    worker.call.return_value = 1  # health check ping returns 1
     return worker
 
 
@@ -146,6 +154,66 @@ class TestGetPage:
             conn = fresh_pool._connections["sess-1"]
             assert conn.last_used_at > old_time
 
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_health_check_uses_cache_preserving_ping(self, MockWorker, fresh_pool):
+        mock_worker = _make_mock_worker()
+        MockWorker.return_value = mock_worker
+        fresh_pool.connect("sess-1", "wss://example.com/ws")
+        with fresh_pool._lock:
+            fresh_pool._connections["sess-1"].last_used_at -= 60  # idle past interval
+
+        fresh_pool.get_page("sess-1")
+
+        mock_worker.call.assert_called_once_with("ping", {})
+
+
+class TestGetOrConnect:
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_connects_once_then_reuses_worker(self, MockWorker, fresh_pool):
+        MockWorker.return_value = _make_mock_worker()
+
+        first = fresh_pool.get_or_connect("cdp-1", "wss://example.com/ws")
+        second = fresh_pool.get_or_connect("cdp-1", "wss://example.com/ws")
+
+        assert first is second
+        assert MockWorker.call_count == 1
+
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_reconnects_when_worker_died(self, MockWorker, fresh_pool):
+        dead, fresh = _make_mock_worker(), _make_mock_worker()
+        MockWorker.side_effect = [dead, fresh]
+        fresh_pool.get_or_connect("cdp-1", "wss://example.com/ws")
+
+        dead._proc.poll.return_value = 1
+        dead.call.side_effect = ConnectionUnhealthy("pipe closed")
+        fresh_pool.get_or_connect("cdp-1", "wss://example.com/ws")
+
+        assert MockWorker.call_count == 2
+        assert fresh_pool.size == 1
+        dead.stop.assert_called_once()
+
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_shared_connection_has_no_provider_metadata(self, MockWorker, fresh_pool):
+        MockWorker.return_value = _make_mock_worker()
+
+        fresh_pool.get_or_connect("cdp-1", "wss://example.com/ws")
+
+        assert fresh_pool.get_session_info("cdp-1") == (None, "")
+
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_cleanup_drops_idle_shared_connections_sooner(self, MockWorker):
+        pool = ConnectionPool(max_idle_seconds=1800)
+        MockWorker.return_value = _make_mock_worker()
+        pool.connect("sess-1", "wss://a.com/ws")
+        pool.get_or_connect("cdp-1", "wss://b.com/ws")
+        pool.connect("sess-2", "wss://c.com/ws")
+        for sid in ("sess-1", "cdp-1"):
+            pool._connections[sid].last_used_at -= 600  # idle 10 min: past the shared TTL
+
+        pool.cleanup_stale()
+
+        assert list(pool._connections) == ["sess-1", "sess-2"]
+
 
 class TestDisconnect:
     @patch("utils.connection_pool._SubprocessWorker")
@@ -254,3 +322,372 @@ class TestEdgeCases:
         assert fresh_pool.has("sess-1")
         fresh_pool.disconnect("sess-1")
         assert not fresh_pool.has("sess-1")
+
+
+class TestLineCodec:
+    PAYLOAD = {"id": 7, "op": "fill", "params": {"selector": "#q", "text": "héllo\n世界"}}
+
+    def test_round_trip(self):
+        line = _encode_line(self.PAYLOAD)
+        assert line.endswith(b"\n")
+        assert line.count(b"\n") == 1  # embedded newlines stay escaped
+        assert _decode_line(line) == self.PAYLOAD
+
+    def test_round_trip_without_orjson(self):
+        with patch("utils.connection_pool.orjson", None):
+            line = _encode_line(self.PAYLOAD)
+            assert _decode_line(line) == self.PAYLOAD
+
+
+def _make_mock_proc(alive=True):
+    proc = MagicMock()
+    proc.poll.return_value = None if alive else 1
+    return proc
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestStandbyWorkers:
+    def test_take_is_empty_until_replenished(self):
+        standby = _StandbyWorkers(size=1)
+        assert standby.take() is None
+
+    @patch("utils.connection_pool._spawn_worker")
+    def test_replenish_spawns_standby_in_background(self, mock_spawn):
+        proc = _make_mock_proc()
+        mock_spawn.return_value = proc
+        standby = _StandbyWorkers(size=1)
+
+        standby.replenish()
+
+        assert _wait_until(lambda: mock_spawn.call_count == 1)
+        mock_spawn.assert_called_once_with(["--standby"])
+        assert _wait_until(lambda: not standby._refilling)
+        assert standby.take() is proc
+
+    def test_take_skips_dead_workers(self):
+        standby = _StandbyWorkers(size=2)
+        alive = _make_mock_proc()
+        standby._procs = [alive, _make_mock_proc(alive=False)]
+
+        assert standby.take() is alive
+        assert standby.take() is None
+
+    def test_shutdown_terminates_standbys_and_stops_refills(self):
+        standby = _StandbyWorkers(size=1)
+        proc = _make_mock_proc()
+        standby._procs = [proc]
+
+        standby.shutdown()
+
+        proc.stdin.close.assert_called_once()
+        proc.terminate.assert_called_once()
+        with patch("utils.connection_pool._spawn_worker") as mock_spawn:
+            standby.replenish()
+            mock_spawn.assert_not_called()
+
+    @patch("utils.connection_pool._spawn_worker")
+    def test_release_terminates_standbys_but_allows_refill(self, mock_spawn):
+        standby = _StandbyWorkers(size=1)
+        proc = _make_mock_proc()
+        standby._procs = [proc]
+
+        standby.release()
+
+        proc.terminate.assert_called_once()
+        assert standby.take() is None
+        fresh = _make_mock_proc()
+        mock_spawn.return_value = fresh
+        standby.replenish()
+        assert _wait_until(lambda: not standby._refilling)
+        assert standby.take() is fresh
+
+    def test_release_discards_refill_in_flight(self):
+        standby = _StandbyWorkers(size=1)
+        late = _make_mock_proc()
+
+        def spawn(args):
+            standby.release()  # pool went idle while the standby was starting
+            return late
+
+        with patch("utils.connection_pool._spawn_worker", side_effect=spawn):
+            standby.replenish()
+            assert _wait_until(lambda: not standby._refilling)
+
+        late.terminate.assert_called_once()
+        assert standby.take() is None
+
+
+class TestStandbyRelease:
+    def test_standby_kept_shortly_after_a_session_start(self):
+        standby = _StandbyWorkers(size=1)
+        proc = _make_mock_proc()
+        standby._procs = [proc]
+        standby._refilling = True  # no refill thread: only the demand mark
+        standby.replenish()
+
+        standby.release_if_idle(120)
+
+        proc.terminate.assert_not_called()
+
+    def test_standby_released_once_idle(self):
+        standby = _StandbyWorkers(size=1)
+        proc = _make_mock_proc()
+        standby._procs = [proc]
+        standby._last_demand = time.monotonic() - 121
+
+        standby.release_if_idle(120)
+
+        proc.terminate.assert_called_once()
+        assert standby.take() is None
+
+    @patch("utils.connection_pool._standby")
+    def test_stale_sweep_releases_idle_standby_even_with_live_sessions(self, mock_standby):
+        pool = ConnectionPool(max_idle_seconds=1800)
+        with patch("utils.connection_pool._SubprocessWorker") as mock_worker:
+            mock_worker.return_value = _make_mock_worker()
+            pool.connect("sess-1", "wss://example.com/ws")
+
+        pool.cleanup_stale()
+
+        assert pool.size == 1
+        mock_standby.release_if_idle.assert_called_once_with(120)
+
+
+class TestWorkerStartup:
+    @patch("utils.connection_pool._spawn_worker")
+    @patch("utils.connection_pool._standby")
+    def test_uses_standby_worker_when_available(self, mock_standby, mock_spawn):
+        proc = _make_mock_proc()
+        proc.stdout.readline.return_value = b'{"ok": true, "ready": true}\n'
+        mock_standby.take.return_value = proc
+
+        worker = _SubprocessWorker("sess-1", "wss://example.com/ws", timeout_ms=5000)
+
+        assert worker._proc is proc
+        mock_spawn.assert_not_called()
+        sent = _decode_line(proc.stdin.write.call_args[0][0])
+        assert sent["op"] == "connect"
+        assert sent["params"] == {"ws_endpoint": "wss://example.com/ws", "timeout_ms": 5000}
+        mock_standby.replenish.assert_called_once()
+
+    @patch("utils.connection_pool._spawn_worker")
+    @patch("utils.connection_pool._standby")
+    def test_spawns_directly_without_standby(self, mock_standby, mock_spawn):
+        proc = _make_mock_proc()
+        proc.stdout.readline.return_value = b'{"ok": true, "ready": true}\n'
+        mock_standby.take.return_value = None
+        mock_spawn.return_value = proc
+
+        worker = _SubprocessWorker("sess-1", "wss://example.com/ws", timeout_ms=5000)
+
+        assert worker._proc is proc
+        mock_spawn.assert_called_once_with(["wss://example.com/ws", "5000"])
+
+
+def _started_worker(*response_lines):
+    """A _SubprocessWorker whose fake process answers with *response_lines*."""
+    proc = _make_mock_proc()
+    proc.stdout.readline.side_effect = [b'{"ok": true, "ready": true}\n', *response_lines]
+    with patch("utils.connection_pool._standby") as mock_standby:
+        mock_standby.take.return_value = None
+        with patch("utils.connection_pool._spawn_worker", return_value=proc):
+            return _SubprocessWorker("sess-1", "wss://example.com/ws")
+
+
+class TestWorkerCall:
+    def test_response_is_parsed_after_releasing_io_lock(self):
+        worker = _started_worker(b'{"ok": true, "result": "aGk="}\n')
+
+        lock_held = []
+        original_parse = worker._parse_line
+
+        def _parse(line):
+            lock_held.append(worker._io_lock.locked())
+            return original_parse(line)
+
+        with patch.object(_SubprocessWorker, "_parse_line", side_effect=_parse):
+            assert worker.call("screenshot", {"type": "png"}) == "aGk="
+        assert lock_held == [False]
+
+    def test_deferred_load_timeout_is_not_reported_as_element_timeout(self):
+        worker = _started_worker(
+            b'{"ok": false, "error": "PageLoadTimeoutError: Page did not reach '
+            b'DOMContentLoaded within 30000 ms of navigation start"}\n'
+        )
+
+        with pytest.raises(PageLoadTimeoutError, match="^Page did not reach"):
+            worker.call("click", {"selector": "#go"})
+
+    def test_lost_target_marks_worker_unhealthy(self):
+        worker = _started_worker(
+            b'{"ok": false, "error": "TargetLostError: TargetClosedError: '
+            b'Target page, context or browser has been closed"}\n'
+        )
+
+        with pytest.raises(ConnectionUnhealthy, match="Browser page lost"):
+            worker.call("click", {"selector": "#go"})
+
+    def test_write_to_exited_worker_is_unhealthy(self):
+        worker = _started_worker()
+        worker._proc.stdin.write.side_effect = BrokenPipeError()
+
+        with pytest.raises(ConnectionUnhealthy, match="closed pipe"):
+            worker.call("url", {})
+
+
+class TestSessionLocking:
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_session_locks_are_dropped_after_use(self, MockWorker, fresh_pool):
+        MockWorker.return_value = _make_mock_worker()
+
+        fresh_pool.connect("sess-1", "wss://example.com/ws")
+        fresh_pool.get_page("sess-1")
+
+        assert fresh_pool._session_locks == {}
+
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_pool_full_stops_worker_outside_pool_lock(self, MockWorker):
+        pool = ConnectionPool(max_idle_seconds=60, max_size=1)
+        lock_held = []
+        rejected = _make_mock_worker()
+        rejected.stop.side_effect = lambda: lock_held.append(pool._lock.locked())
+        MockWorker.side_effect = [_make_mock_worker(), rejected]
+
+        pool.connect("sess-1", "wss://a.com/ws")
+        with pytest.raises(RuntimeError, match="full"):
+            pool.connect("sess-2", "wss://b.com/ws")
+
+        assert lock_held == [False]
+
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_slow_connect_does_not_block_other_sessions(self, MockWorker, fresh_pool):
+        import threading
+
+        release = threading.Event()
+        started = threading.Event()
+
+        def _make(session_id, **kwargs):
+            if session_id == "slow":
+                started.set()
+                release.wait(timeout=5)
+            return _make_mock_worker()
+
+        MockWorker.side_effect = _make
+        slow = threading.Thread(target=fresh_pool.connect, args=("slow", "wss://a.com/ws"))
+        slow.start()
+        assert started.wait(timeout=5)
+
+        fresh_pool.connect("fast", "wss://b.com/ws")
+        assert fresh_pool.has("fast")
+
+        release.set()
+        slow.join(timeout=5)
+        assert fresh_pool.has("slow")
+
+
+class TestPageProxy:
+    def test_screenshot_decodes_worker_base64(self):
+        worker = _make_mock_worker()
+        worker.call.return_value = "iVBORw0KGgo="
+
+        data = _PooledPageProxy(worker).screenshot(image_type="jpeg", quality=70)
+
+        assert data == b"\x89PNG\r\n\x1a\n"
+        worker.call.assert_called_once_with("screenshot", {"type": "jpeg", "quality": 70})
+
+
+class TestLruEviction:
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_get_page_marks_session_most_recently_used(self, MockWorker, fresh_pool):
+        MockWorker.return_value = _make_mock_worker()
+        fresh_pool.connect("sess-1", "wss://a.com/ws")
+        fresh_pool.connect("sess-2", "wss://b.com/ws")
+
+        fresh_pool.get_page("sess-1")
+
+        assert list(fresh_pool._connections) == ["sess-2", "sess-1"]
+
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_full_pool_evicts_idle_lru_connection_without_provider(self, MockWorker):
+        pool = ConnectionPool(max_idle_seconds=3600, max_size=3)
+        old_worker = _make_mock_worker()
+        MockWorker.side_effect = [
+            _make_mock_worker(), old_worker, _make_mock_worker(), _make_mock_worker(),
+        ]
+        pool.connect("sess-1", "wss://a.com/ws")
+        pool.connect("cdp-1", "wss://b.com/ws", provider_name=None)
+        pool.connect("sess-2", "wss://c.com/ws")
+        for sid in ("sess-1", "cdp-1"):
+            pool._connections[sid].last_used_at -= 600  # idle for 10 minutes
+
+        pool.connect("sess-3", "wss://d.com/ws")
+
+        assert list(pool._connections) == ["sess-1", "sess-2", "sess-3"]
+        old_worker.stop.assert_called_once()
+
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_full_pool_never_evicts_provider_sessions(self, MockWorker):
+        pool = ConnectionPool(max_idle_seconds=3600, max_size=2)
+        rejected = _make_mock_worker()
+        MockWorker.side_effect = [_make_mock_worker(), _make_mock_worker(), rejected]
+        pool.connect("sess-1", "wss://a.com/ws", provider_name="hyperbrowser", api_key="k")
+        pool.connect("sess-2", "wss://b.com/ws")
+        pool._connections["sess-1"].last_used_at -= 600
+
+        with pytest.raises(RuntimeError, match="full"):
+            pool.connect("sess-3", "wss://c.com/ws")
+
+        assert pool.get_session_info("sess-1") == ("hyperbrowser", "k")
+        rejected.stop.assert_called_once()
+
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_cleanup_stops_at_first_fresh_connection(self, MockWorker):
+        pool = ConnectionPool(max_idle_seconds=60)
+        MockWorker.return_value = _make_mock_worker()
+        pool.connect("sess-1", "wss://a.com/ws")
+        pool.connect("sess-2", "wss://b.com/ws")
+        pool._connections["sess-1"].last_used_at -= 120
+
+        pool.cleanup_stale()
+
+        assert list(pool._connections) == ["sess-2"]
+
+
+class TestConcurrentShutdown:
+    @patch("utils.connection_pool._SubprocessWorker")
+    def test_disconnect_all_stops_workers_in_parallel(self, MockWorker, fresh_pool):
+        # Every stop blocks until all four are running at once; stopped one
+        # after another, the first wait times out and breaks the barrier.
+        barrier = threading.Barrier(4, timeout=5)
+        workers = [_make_mock_worker() for _ in range(4)]
+        for w in workers:
+            w.stop.side_effect = barrier.wait
+        MockWorker.side_effect = workers
+        for i in range(4):
+            fresh_pool.connect(f"sess-{i}", f"wss://example.com/{i}")
+
+        fresh_pool.disconnect_all()
+
+        assert fresh_pool.size == 0
+        for w in workers:
+            w.stop.assert_called_once()
+        assert not barrier.broken
+
+    def test_falls_back_to_inline_when_threads_cannot_start(self):
+        # Python 3.12+ refuses new threads inside atexit handlers.
+        stopped = []
+        with patch(
+            "utils.connection_pool.threading.Thread.start",
+            side_effect=RuntimeError("can't create new thread at interpreter shutdown"),
+        ):
+            _run_concurrently(stopped.append, ["w1", "w2", "w3"])
+
+        assert stopped == ["w1", "w2", "w3"]
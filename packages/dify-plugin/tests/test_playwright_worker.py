@@ -1,12 +1,40 @@
 """Unit tests for JS selector behavior in playwright_worker."""
 
+import io
+import json
 import sys
+import time
 from pathlib import Path
-from unittest.mock import MagicMock
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.playwright_worker import _is_js_selector, _js_wait_for_selector
+from utils.playwright_worker import (
+    _DOCUMENT_FREE_OPS,
+    _DOM_TOKEN_FN_JS,
+    _FIND_ELEMENT_JS,
+    _HOLDER_JS,
+    _HOLDER_NAME,
+    _MUTATING_OPS,
+    _NAVIGATION_OPS,
+    _NOT_INSTALLED,
+    _OPS,
+    _UNCHANGED,
+    PageLoadTimeoutError,
+    _evaluate_installed,
+    _evaluate_with_finder,
+    _install_finder,
+    _is_js_selector,
+    _js_wait_for_selector,
+    _LoadGate,
+    _ReadCache,
+    _Session,
+    main,
+)
 
 
 class TestJsSelectorDetection:
@@ -21,6 +49,89 @@ class TestJsSelectorDetection:
     def test_css_selector_not_treated_as_js_selector(self):
         assert not _is_js_selector("button.submit")
 
+    def test_attribute_and_empty_selectors_not_treated_as_js_selector(self):
+        assert not _is_js_selector("[name=q]")
+        assert not _is_js_selector("(button)")
+        assert not _is_js_selector("   ")
+
+
+class TestInstalledScripts:
+    def test_finder_source_is_sent_only_when_missing(self):
+        page = MagicMock()
+        page.evaluate.side_effect = [_NOT_INSTALLED, True, True]
+
+        assert _evaluate_with_finder(page, "return true;") is True
+        assert _evaluate_with_finder(page, "return true;") is True
+
+        sent = [c.args[0] for c in page.evaluate.call_args_list]
+        assert [_FIND_ELEMENT_JS in js for js in sent] == [False, True, False]
+        assert "__abHolder.find = __findElement" in sent[1]
+
+    def test_finder_is_registered_for_every_document(self):
+        page = MagicMock()
+
+        _install_finder(page)
+
+        init_script = page.add_init_script.call_args.kwargs["script"]
+        assert _FIND_ELEMENT_JS in init_script
+        # Wrapped, so __findElement does not leak into the page's globals.
+        assert init_script.startswith("(function() {")
+        page.evaluate.assert_called_once_with(init_script)
+
+    def test_installed_finder_costs_one_evaluate_per_call(self):
+        page = MagicMock()
+        page.evaluate.return_value = {"x": 1, "y": 2}
+
+        _evaluate_with_finder(page, "return __findElement('@e3');")
+
+        page.evaluate.assert_called_once()
+        assert _FIND_ELEMENT_JS not in page.evaluate.call_args.args[0]
+
+    def test_first_snapshot_registers_script_then_reuses_it(self):
+        page = MagicMock()
+        page.evaluate.side_effect = [
+            {"token": "t1", "result": {"tree": 1}},
+            {"token": "t2", "result": {"tree": 2}},
+        ]
+        session = _Session(page)
+        params = {"expression": "(function() { return walk(); })()"}
+
+        assert _OPS["snapshot"](session, params) == {"tree": 1}
+        session.reads.invalidate()
+        assert _OPS["snapshot"](session, params) == {"tree": 2}
+
+        page.add_init_script.assert_called_once()
+        assert params["expression"] in page.add_init_script.call_args.kwargs["script"]
+        sent = [c.args[0] for c in page.evaluate.call_args_list]
+        assert [params["expression"] in js for js in sent] == [True, False]
+
+    def test_helpers_live_on_one_randomly_named_holder(self):
+        assert _HOLDER_NAME not in ("__abFindElement", "__abScripts")
+        assert "Object.defineProperty(window" in _HOLDER_JS
+        for js in (_DOM_TOKEN_FN_JS, _FIND_ELEMENT_JS):
+            assert "window.__ab" not in js
+
+    def test_expression_installed_on_demand_then_invoked(self):
+        page = MagicMock()
+        page.evaluate.side_effect = [
+            _NOT_INSTALLED,
+            {"token": "t1", "result": {"tree": 1}},
+            {"token": "t2", "result": {"tree": 2}},
+        ]
+        expression = "(function() { return walk(); })()"
+
+        assert _evaluate_installed(page, 0, expression, None)["result"] == {"tree": 1}
+        assert _evaluate_installed(page, 0, expression, "t1")["result"] == {"tree": 2}
+
+        sent = [c.args[0] for c in page.evaluate.call_args_list]
+        assert [expression in js for js in sent] == [False, True, False]
+        # The cached token is passed in, so the check costs no extra trip.
+        assert page.evaluate.call_args.args[1] == "t1"
+
+    def test_dom_token_covers_form_control_state(self):
+        # value / checked are IDL properties the MutationObserver never sees.
+        assert "el.value" in _DOM_TOKEN_FN_JS and "el.checked" in _DOM_TOKEN_FN_JS
+
 
 class TestJsWaitForSelector:
     def test_wait_for_selector_uses_wait_for_function_with_timeout(self):
@@ -29,6 +140,287 @@ class TestJsWaitForSelector:
         _js_wait_for_selector(page, "[ref=e1]", timeout=1500.0)
 
         page.wait_for_function.assert_called_once()
-        _, kwargs = page.wait_for_function.call_args
+        predicate, kwargs = page.wait_for_function.call_args
         assert kwargs["timeout"] == 1500.0
+        assert _FIND_ELEMENT_JS not in predicate[0]
+
+    def test_missing_finder_is_installed_and_wait_resumes(self):
+        page = MagicMock()
+        page.wait_for_function.return_value.json_value.side_effect = [_NOT_INSTALLED, True]
+
+        _js_wait_for_selector(page, "@e2", timeout=1500.0)
+
+        assert page.wait_for_function.call_count == 2
+        page.evaluate.assert_called_once()
+        assert _FIND_ELEMENT_JS in page.evaluate.call_args.args[0]
+        assert page.wait_for_function.call_args.kwargs["timeout"] <= 1500.0
+
+
+def _snapshot_replies(*tokens):
+    """compute(token) fake: the page's DOM token is *tokens* in order."""
+    token_iter = iter(tokens)
+    calls = []
+
+    def compute(cached):
+        calls.append(cached)
+        token = next(token_iter)
+        if token == cached:
+            return _UNCHANGED
+        return {"token": token, "result": {"walk": len(calls)}}
+
+    return compute, calls
+
+
+class TestReadCache:
+    KEY = "SNAPSHOT"
+
+    def test_unchanged_dom_reuses_cached_snapshot(self):
+        compute, calls = _snapshot_replies("doc:1", "doc:1")
+        cache = _ReadCache()
+
+        first = cache.get(self.KEY, compute)
+        second = cache.get(self.KEY, compute)
+
+        assert first is second
+        assert calls == [None, "doc:1"]
+
+    def test_dom_change_triggers_new_walk(self):
+        compute, calls = _snapshot_replies("doc:1", "doc:2")
+        cache = _ReadCache()
+
+        first = cache.get(self.KEY, compute)
+        second = cache.get(self.KEY, compute)
+
+        assert (first, second) == ({"walk": 1}, {"walk": 2})
+
+    def test_after_invalidate_no_token_is_offered(self):
+        compute, calls = _snapshot_replies("doc:1", "doc:1")
+        cache = _ReadCache()
+
+        cache.get(self.KEY, compute)
+        cache.invalidate()
+        assert cache.get(self.KEY, compute) == {"walk": 2}
+
+        # Nothing cached: the page is asked to walk straight away.
+        assert calls == [None, None]
+
+    def test_entries_are_keyed_by_expression(self):
+        compute, calls = _snapshot_replies("doc:1", "doc:1", "doc:1")
+        cache = _ReadCache()
+
+        cache.get("A", compute)
+        cache.get("B", compute)
+        assert cache.get("A", compute) == {"walk": 1}
+
+        assert calls == [None, None, "doc:1"]
+
+
+class TestLoadGate:
+    def test_wait_is_noop_until_armed(self):
+        page = MagicMock()
+        _LoadGate().wait(page)
+        page.wait_for_load_state.assert_not_called()
+
+    def test_armed_gate_waits_once_with_remaining_navigation_budget(self):
+        page = MagicMock()
+        gate = _LoadGate()
+        gate.arm(15000.0, started_at=100.0)
+
+        with patch("utils.playwright_worker.time.monotonic", return_value=104.0):
+            gate.wait(page)
+            gate.wait(page)
+
+        page.wait_for_load_state.assert_called_once_with("domcontentloaded", timeout=11000.0)
+
+    def test_exhausted_budget_still_checks_load_state(self):
+        page = MagicMock()
+        gate = _LoadGate()
+        gate.arm(1000.0, started_at=100.0)
+
+        with patch("utils.playwright_worker.time.monotonic", return_value=200.0):
+            gate.wait(page)
+
+        page.wait_for_load_state.assert_called_once_with("domcontentloaded", timeout=1.0)
+
+    def test_load_timeout_raises_distinct_error(self):
+        page = MagicMock()
+        page.wait_for_load_state.side_effect = PlaywrightTimeoutError("Timeout 1ms exceeded.")
+        gate = _LoadGate()
+        gate.arm(15000.0, started_at=time.monotonic())
+
+        with pytest.raises(PageLoadTimeoutError, match="DOMContentLoaded within 15000 ms"):
+            gate.wait(page)
+
+    def test_load_timeout_without_explicit_budget_keeps_distinct_error(self):
+        page = MagicMock()
+        page.wait_for_load_state.side_effect = PlaywrightTimeoutError("Timeout 30000ms exceeded.")
+        gate = _LoadGate()
+        gate.arm(None, started_at=time.monotonic())
+
+        with pytest.raises(PageLoadTimeoutError, match="within Playwright's default timeout"):
+            gate.wait(page)
+        assert page.wait_for_load_state.call_args.kwargs["timeout"] is None
+
+    def test_clear_drops_pending_wait(self):
+        page = MagicMock()
+        gate = _LoadGate()
+        gate.arm(15000.0, started_at=time.monotonic())
+        gate.clear()
+
+        gate.wait(page)
+
+        page.wait_for_load_state.assert_not_called()
+
+
+class TestOpDispatch:
+    def test_every_cached_or_gated_op_has_a_handler(self):
+        assert (_MUTATING_OPS | _NAVIGATION_OPS) - {"close"} <= set(_OPS)
+
+    def test_health_ping_keeps_cache_and_skips_load_gate(self):
+        assert "ping" in _OPS
+        assert "ping" not in _MUTATING_OPS
+        assert "ping" in _DOCUMENT_FREE_OPS
+
+    def test_navigation_handlers_return_no_response_object(self):
+        session = _Session(MagicMock())
+        assert _OPS["go_back"](session, {}) is None
+        assert _OPS["reload"](session, {"wait_until": "load"}) is None
+        session.page.reload.assert_called_once_with(wait_until="load")
+
+    def test_ref_text_read_resolves_element_via_finder(self):
+        page = MagicMock()
+        page.evaluate.return_value = "Sign In"
+        session = _Session(page)
+
+        assert _OPS["inner_text"](session, {"selector": "@e3"}) == "Sign In"
+
+        page.inner_text.assert_not_called()
+        finder_call = page.evaluate.call_args_list[-1].args[0]
+        assert '__findElement("@e3")' in finder_call and "el.innerText" in finder_call
+
+    def test_css_html_read_uses_playwright_and_leaves_markup_untouched(self):
+        session = _Session(MagicMock())
+        session.page.inner_html.return_value = '<button id="go">Go</button>'
+
+        assert _OPS["inner_html"](session, {"selector": "#main"}) == '<button id="go">Go</button>'
+        session.page.inner_html.assert_called_once_with("#main")
+
+    def test_text_reads_are_not_cached(self):
+        # A cache would need a DOM-token round trip, and the token misses
+        # shadow-tree changes that Playwright's CSS engine can see.
+        session = _Session(MagicMock())
+        session.page.inner_text.side_effect = ["$10", "$12"]
+
+        assert _OPS["inner_text"](session, {"selector": "price-tag span"}) == "$10"
+        assert _OPS["inner_text"](session, {"selector": "price-tag span"}) == "$12"
+
+        session.page.evaluate.assert_not_called()
+
+
+def _run_worker(monkeypatch, argv, requests, browser):
+    """Run main() over *requests* (JSON lines) and return its exit code and replies."""
+    pw = MagicMock()
+    pw.chromium.connect_over_cdp.return_value = browser
+    monkeypatch.setattr(
+        "utils.playwright_worker.sync_playwright", lambda: MagicMock(start=lambda: pw)
+    )
+    monkeypatch.setattr(sys, "argv", ["playwright_worker.py", *argv])
+    stdin = b"".join(json.dumps(r).encode() + b"\n" for r in requests)
+    stdout = io.BytesIO()
+    monkeypatch.setattr(sys, "stdin", SimpleNamespace(buffer=io.BytesIO(stdin)))
+    monkeypatch.setattr(sys, "stdout", SimpleNamespace(buffer=stdout))
+
+    code = main()
+
+    replies = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    return code, replies, pw
+
+
+def _browser():
+    browser = MagicMock()
+    browser.is_connected.return_value = True
+    page = browser.contexts[0].pages[0]
+    page.is_closed.return_value = False
+    return browser, page
+
+
+class TestWorkerLoop:
+    def test_ordinary_error_keeps_serving(self, monkeypatch):
+        browser, page = _browser()
+        page.goto.side_effect = [RuntimeError("net::ERR_NAME_NOT_RESOLVED"), None]
+        requests = [
+            {"id": 1, "op": "goto", "params": {"url": "https://bad.invalid"}},
+            {"id": 2, "op": "goto", "params": {"url": "https://example.com"}},
+        ]
+
+        code, replies, _ = _run_worker(monkeypatch, ["ws://cdp", "5000"], requests, browser)
+
+        assert code == 0
+        assert replies[0] == {"ok": True, "ready": True}
+        assert replies[1]["error"].startswith("RuntimeError: ")
+        assert replies[2] == {"id": 2, "ok": True, "result": None}
+
+    def test_browser_disconnect_replies_target_lost_and_exits(self, monkeypatch):
+        browser, page = _browser()
+
+        def drop(*args, **kwargs):
+            browser.is_connected.return_value = False
+            raise RuntimeError("Target closed")
+
+        page.goto.side_effect = drop
+        requests = [
+            {"id": 1, "op": "goto", "params": {"url": "https://example.com"}},
+            {"id": 2, "op": "title", "params": {}},
+        ]
+
+        _, replies, _ = _run_worker(monkeypatch, ["ws://cdp", "5000"], requests, browser)
+
+        assert replies[1]["error"] == "TargetLostError: RuntimeError: Target closed"
+        # The loop broke out: the second request got no reply.
+        assert len(replies) == 2
+        browser.close.assert_called_once()
+
+    def test_closed_page_is_treated_like_a_disconnect(self, monkeypatch):
+        browser, page = _browser()
+
+        def close(*args, **kwargs):
+            page.is_closed.return_value = True
+            raise RuntimeError("Target page, context or browser has been closed")
+
+        page.goto.side_effect = close
+        requests = [
+            {"id": 1, "op": "goto", "params": {"url": "https://example.com"}},
+            {"id": 2, "op": "title", "params": {}},
+        ]
+
+        _, replies, _ = _run_worker(monkeypatch, ["ws://cdp", "5000"], requests, browser)
+
+        assert replies[1]["error"].startswith("TargetLostError: RuntimeError: ")
+        assert len(replies) == 2
+
+    def test_standby_connects_on_request_then_serves(self, monkeypatch):
+        browser, page = _browser()
+        page.title.return_value = "Example"
+        requests = [
+            {"op": "connect", "params": {"ws_endpoint": "ws://cdp", "timeout_ms": 5000}},
+            {"id": 1, "op": "title", "params": {}},
+        ]
+
+        code, replies, pw = _run_worker(monkeypatch, ["--standby"], requests, browser)
+
+        assert code == 0
+        pw.chromium.connect_over_cdp.assert_called_once_with("ws://cdp", timeout=5000.0)
+        assert replies == [
+            {"ok": True, "ready": True},
+            {"id": 1, "ok": True, "result": "Example"},
+        ]
+
+    def test_standby_exits_cleanly_when_stdin_closes(self, monkeypatch):
+        browser, _ = _browser()
+
+        code, replies, pw = _run_worker(monkeypatch, ["--standby"], [], browser)
 
+        assert code == 0
+        assert replies == []
+        pw.chromium.connect_over_cdp.assert_not_called()
+        pw.stop.assert_called_once()
@@ -62,7 +62,7 @@ class TestRagArxivWorkflowWithSnapshotRecovery:
             return None
 
         page.wait_for_selector.side_effect = wait_selector_side_effect
-        page.evaluate.return_value = {
+        page.snapshot.return_value = {
             "tree": {
                 "role": "generic",
                 "children": [
@@ -126,7 +126,7 @@ class TestRagArxivWorkflowWithSnapshotRecovery:
                 }
             )
         )[0].message.text
-        assert "Navigation successful" in nav
+        assert "Navigation committed" in nav
 
         list(
             op_tool._invoke(
@@ -1,15 +1,16 @@
 """Browser Operator Tool — unified browser page operation dispatcher.
 
-Consolidates 15 individual browser tools into one with action-based dispatch.
+Consolidates the individual browser tools into one with action-based dispatch
+(16 actions, including screenshot).
 All action-specific parameter validation is performed by ``_pre_validate``
 *before* the CDP connection is established, so handler functions assume their
 required parameters are already present.
 """
 
+import hashlib
 import ipaddress
 import logging
 import socket
-import uuid
 from collections.abc import Callable, Generator
 from typing import Any
 from urllib.parse import urlparse
@@ -42,6 +43,7 @@ PlaywrightTimeout: type[Exception] = _StubException
 ConnectionNotFound: type[Exception] = _StubException
 ConnectionUnhealthy: type[Exception] = _StubException
 WorkerTimeoutError: type[Exception] = _StubException
+PageLoadTimeoutError: type[Exception] = _StubException
 
 
 pool = None  # Module-level alias set by _ensure_browser_deps(); patchable by tests.
@@ -49,7 +51,7 @@ pool = None  # Module-level alias set by _ensure_browser_deps(); patchable by te
 
 def _ensure_browser_deps():
     """Lazy-import browser dependencies on first use (thread-safe)."""
-    global pool, _pool, _lazy_imported, PlaywrightTimeout, ConnectionNotFound, ConnectionUnhealthy, WorkerTimeoutError
+    global pool, _pool, _lazy_imported, PlaywrightTimeout, ConnectionNotFound, ConnectionUnhealthy, WorkerTimeoutError, PageLoadTimeoutError
     if _lazy_imported:
         return
     with _lazy_lock:
@@ -64,12 +66,14 @@ def _ensure_browser_deps():
         from utils.connection_pool import (
             ConnectionNotFound as _CNF,
             ConnectionUnhealthy as _CU,
+            PageLoadTimeoutError as _PLTE,
             WorkerTimeoutError as _WTE,
             pool as _p,
         )
         ConnectionNotFound = _CNF
         ConnectionUnhealthy = _CU
         WorkerTimeoutError = _WTE
+        PageLoadTimeoutError = _PLTE
         _pool = _p
         pool = _p  # update module-level alias
         # Only mark as done AFTER all imports succeed.
@@ -86,6 +90,14 @@ def _safe_timeout(raw: Any, default: int = 30000) -> int:
         return default
 
 
+def _cdp_session_id(cdp_url: str) -> str:
+    """Pool key shared by all cdp_url-only calls to the same endpoint.
+
+    Hashed so that endpoint tokens embedded in the URL never become a key.
+    """
+    return "cdp-" + hashlib.sha256(cdp_url.encode()).hexdigest()[:16]
+
+
 # ---------------------------------------------------------------------------
 # Action handlers
 # Pre-conditions: _pre_validate has already run, so required params are present.
@@ -96,14 +108,18 @@ def _safe_timeout(raw: Any, default: int = 30000) -> int:
 def _handle_navigate(
     tool: Tool, page: Any, params: dict[str, Any],
 ) -> Generator[ToolInvokeMessage, None, None]:
-    """Navigate to a URL."""
+    """Navigate to a URL.
+
+    Returns once the navigation commits; the worker waits for
+    DOMContentLoaded lazily, before the next action that touches the page,
+    so rendering overlaps with the caller's next step. The title is not
+    reported because the document may not have parsed yet.
+    """
     url = (params.get("url") or "").strip()
     timeout_ms = _safe_timeout(params.get("timeout_ms"))
 
-    page.goto(url, timeout=float(timeout_ms), wait_until="domcontentloaded")
-    yield tool.create_text_message(
-        f"Navigation successful.\nURL: {page.url}\nTitle: {page.title()}"
-    )
+    page.goto(url, timeout=float(timeout_ms), wait_until="commit")
+    yield tool.create_text_message(f"Navigation committed.\nURL: {page.url}")
 
 
 def _handle_click(
@@ -206,6 +222,13 @@ def _handle_get_text(
 
     try:
         text = page.inner_text(selector or "body")
+    except PageLoadTimeoutError as e:
+        # The previous navigation never finished loading; no element was looked up.
+        yield tool.create_text_message(
+            f"Failed to read page text: {type(e).__name__}: {e}. "
+            "Use action=wait_navigation to wait for the page, or navigate again."
+        )
+        return
     except Exception as e:
         msg = (
             f"No element found for selector: '{selector}'"
@@ -226,6 +249,13 @@ def _handle_get_html(
 
     try:
         html = page.inner_html(selector) if selector else page.content()
+    except PageLoadTimeoutError as e:
+        # The previous navigation never finished loading; no element was looked up.
+        yield tool.create_text_message(
+            f"Failed to read page HTML: {type(e).__name__}: {e}. "
+            "Use action=wait_navigation to wait for the page, or navigate again."
+        )
+        return
     except Exception as e:
         msg = (
             f"No element found for selector: '{selector}'"
@@ -298,6 +328,48 @@ def _handle_reload(
     yield tool.create_text_message(f"Page reloaded.\nURL: {page.url}")
 
 
+_SCREENSHOT_MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg"}
+_DEFAULT_JPEG_QUALITY = 80
+
+
+def _parse_quality(raw: Any) -> int | None:
+    """Parse the screenshot quality param; None when it was not given.
+
+    Raises ValueError for non-integral values (range is checked by
+    ``_pre_validate``).
+    """
+    if raw is None or (isinstance(raw, str) and not raw.strip()):
+        return None
+    number = float(raw)
+    if not number.is_integer():
+        raise ValueError(f"not an integer: {raw!r}")
+    return int(number)
+
+
+def _handle_screenshot(
+    tool: Tool, page: Any, params: dict[str, Any],
+) -> Generator[ToolInvokeMessage, None, None]:
+    """Capture the visible viewport and return it as a binary image blob.
+
+    PNG by default; image_format=jpeg (optionally with quality) shrinks the
+    payload considerably for photographic pages.
+    """
+    image_format = (params.get("image_format") or "png").strip().lower()
+    quality = None
+    if image_format == "jpeg":
+        quality = _parse_quality(params.get("quality"))
+        if quality is None:
+            quality = _DEFAULT_JPEG_QUALITY
+
+    data = page.screenshot(image_type=image_format, quality=quality)
+    yield tool.create_blob_message(
+        blob=data, meta={"mime_type": _SCREENSHOT_MIME_TYPES[image_format]},
+    )
+    yield tool.create_text_message(
+        f"Screenshot captured ({image_format}, {len(data)} bytes).\nURL: {page.url}"
+    )
+
+
 # Accessibility-tree snapshot JS — ported from actionbook CLI browser.rs
 _SNAPSHOT_JS = r"""
 (function() {
@@ -322,49 +394,53 @@ _SNAPSHOT_JS = r"""
         'listitem', 'article', 'region', 'main', 'navigation', 'img'
     ]);
 
-    function getRole(el) {
+    // Static lookup tables, built once per snapshot rather than per node.
+    const TAG_ROLES = {
+        'button': 'button',
+        'select': 'combobox',
+        'textarea': 'textbox',
+        'img': 'img',
+        'h1': 'heading', 'h2': 'heading', 'h3': 'heading',
+        'h4': 'heading', 'h5': 'heading', 'h6': 'heading',
+        'nav': 'navigation', 'main': 'main',
+        'header': 'banner', 'footer': 'contentinfo',
+        'aside': 'complementary', 'form': 'form',
+        'table': 'table',
+        'thead': 'rowgroup', 'tbody': 'rowgroup', 'tfoot': 'rowgroup',
+        'tr': 'row', 'th': 'columnheader', 'td': 'cell',
+        'ul': 'list', 'ol': 'list', 'li': 'listitem',
+        'details': 'group', 'summary': 'button',
+        'dialog': 'dialog',
+        'article': 'article'
+    };
+    const INPUT_ROLES = {
+        'text': 'textbox', 'email': 'textbox', 'password': 'textbox',
+        'search': 'searchbox', 'tel': 'textbox', 'url': 'textbox',
+        'number': 'spinbutton',
+        'checkbox': 'checkbox', 'radio': 'radio',
+        'submit': 'button', 'reset': 'button', 'button': 'button',
+        'range': 'slider'
+    };
+    const HEADING_TAGS = new Set(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']);
+
+    function getRole(el, tag) {
         const explicit = el.getAttribute('role');
         if (explicit) return explicit.toLowerCase();
-        const tag = el.tagName.toLowerCase();
         if (INLINE_TAGS.has(tag)) return tag;
-        const roleMap = {
-            'a': el.hasAttribute('href') ? 'link' : 'generic',
-            'button': 'button',
-            'input': getInputRole(el),
-            'select': 'combobox',
-            'textarea': 'textbox',
-            'img': 'img',
-            'h1': 'heading', 'h2': 'heading', 'h3': 'heading',
-            'h4': 'heading', 'h5': 'heading', 'h6': 'heading',
-            'nav': 'navigation', 'main': 'main',
-            'header': 'banner', 'footer': 'contentinfo',
-            'aside': 'complementary', 'form': 'form',
-            'table': 'table',
-            'thead': 'rowgroup', 'tbody': 'rowgroup', 'tfoot': 'rowgroup',
-            'tr': 'row', 'th': 'columnheader', 'td': 'cell',
-            'ul': 'list', 'ol': 'list', 'li': 'listitem',
-            'details': 'group', 'summary': 'button',
-            'dialog': 'dialog',
-            'section': el.hasAttribute('aria-label') || el.hasAttribute('aria-labelledby') ? 'region' : 'generic',
-            'article': 'article'
-        };
-        return roleMap[tag] || 'generic';
+        if (tag === 'a') return el.hasAttribute('href') ? 'link' : 'generic';
+        if (tag === 'input') return getInputRole(el);
+        if (tag === 'section') {
+            return el.hasAttribute('aria-label') || el.hasAttribute('aria-labelledby') ? 'region' : 'generic';
+        }
+        return TAG_ROLES[tag] || 'generic';
     }
 
     function getInputRole(el) {
         const type = (el.getAttribute('type') || 'text').toLowerCase();
-        const map = {
-            'text': 'textbox', 'email': 'textbox', 'password': 'textbox',
-            'search': 'searchbox', 'tel': 'textbox', 'url': 'textbox',
-            'number': 'spinbutton',
-            'checkbox': 'checkbox', 'radio': 'radio',
-            'submit': 'button', 'reset': 'button', 'button': 'button',
-            'range': 'slider'
-        };
-        return map[type] || 'textbox';
+        return INPUT_ROLES[type] || 'textbox';
     }
 
-    function getAccessibleName(el) {
+    function getAccessibleName(el, tag) {
         const ariaLabel = el.getAttribute('aria-label');
         if (ariaLabel) return ariaLabel.trim();
         const labelledBy = el.getAttribute('aria-labelledby');
@@ -372,7 +448,6 @@ _SNAPSHOT_JS = r"""
             const label = document.getElementById(labelledBy);
             if (label) return (label.textContent || '').trim().substring(0, 100);
         }
-        const tag = el.tagName.toLowerCase();
         if (tag === 'img') return el.getAttribute('alt') || '';
         if (tag === 'input' || tag === 'textarea' || tag === 'select') {
             if (el.id) {
@@ -382,7 +457,7 @@ _SNAPSHOT_JS = r"""
             return el.getAttribute('placeholder') || el.getAttribute('title') || '';
         }
         if (tag === 'a' || tag === 'button' || tag === 'summary') return '';
-        if (['h1','h2','h3','h4','h5','h6'].includes(tag)) {
+        if (HEADING_TAGS.has(tag)) {
             return (el.textContent || '').trim().substring(0, 150);
         }
         const title = el.getAttribute('title');
@@ -390,35 +465,39 @@ _SNAPSHOT_JS = r"""
         return '';
     }
 
-    function isHidden(el) {
+    function isHidden(el, tag) {
         if (el.hidden) return true;
         if (el.getAttribute('aria-hidden') === 'true') return true;
         const style = el.style;
         if (style.display === 'none' || style.visibility === 'hidden') return true;
-        if (el.offsetParent === null && el.tagName.toLowerCase() !== 'body' &&
-            getComputedStyle(el).position !== 'fixed' && getComputedStyle(el).position !== 'sticky') {
+        if (el.offsetParent === null && tag !== 'body') {
             const cs = getComputedStyle(el);
-            if (cs.display === 'none' || cs.visibility === 'hidden') return true;
+            if (cs.position !== 'fixed' && cs.position !== 'sticky' &&
+                (cs.display === 'none' || cs.visibility === 'hidden')) return true;
         }
         return false;
     }
 
     let refCounter = 0;
+    // Element for each ref (index = N in eN), handed to the worker's helper
+    // holder (in scope as __abHolder when the worker runs this script) so its
+    // __findElement can resolve refs without re-walking the DOM.
+    const refElements = [];
 
     function walk(el, depth) {
         if (depth > 15) return null;
         const tag = el.tagName.toLowerCase();
         if (SKIP_TAGS.has(tag)) return null;
-        if (isHidden(el)) return null;
+        if (isHidden(el, tag)) return null;
 
-        const role = getRole(el);
-        const name = getAccessibleName(el);
+        const role = getRole(el, tag);
+        const name = getAccessibleName(el, tag);
         const isInteractive = INTERACTIVE_ROLES.has(role);
         const isContent = CONTENT_ROLES.has(role);
         const shouldRef = isInteractive || (isContent && name);
 
         let ref = null;
-        if (shouldRef) { refCounter++; ref = 'e' + refCounter; }
+        if (shouldRef) { refCounter++; ref = 'e' + refCounter; refElements[refCounter] = el; }
 
         const children = [];
         for (const child of el.childNodes) {
@@ -449,6 +528,7 @@ _SNAPSHOT_JS = r"""
     }
 
     const tree = walk(document.body, 0);
+    if (typeof __abHolder !== 'undefined') __abHolder.refs = refElements;
     return { tree, refCount: refCounter };
 })()
 """
@@ -463,51 +543,60 @@ def _render_snapshot_node(node: dict[str, Any], depth: int = 0) -> str:
       - link "Home" [ref=e3]:
         - /url: https://example.com
         - text: Home
+
+    Walks the tree with an explicit stack (pre-order) and joins the collected
+    lines once, instead of recursing and concatenating strings per node.
     """
-    indent = "  " * depth
-    role = node.get("role", "generic")
-
-    # Text nodes
-    if role == "text":
-        content = node.get("content", "")
-        return f"{indent}- text: {content}\n" if content else ""
-
-    name = node.get("name")
-    ref_id = node.get("ref")
-    url = node.get("url")
-    children = node.get("children", [])
-    has_children = bool(children)
-
-    # Build line: - role "name" [ref=eN] [extra]
-    line = f"{indent}- {role}"
-    if name:
-        line += f' "{name}"'
-    if ref_id:
-        line += f" [ref={ref_id}]"
-
-    level = node.get("level")
-    if level is not None:
-        line += f" [level={level}]"
-    checked = node.get("checked")
-    if checked is not None:
-        line += f" [checked={'true' if checked else 'false'}]"
-    value = node.get("value")
-    if value:
-        line += f' [value="{value}"]'
-
-    if has_children or url:
-        line += ":"
-    line += "\n"
-
-    # URL for links
-    if url:
-        line += f"{indent}  - /url: {url}\n"
-
-    # Children
-    for child in children:
-        line += _render_snapshot_node(child, depth + 1)
-
-    return line
+    lines: list[str] = []
+    stack: list[tuple[dict[str, Any], int]] = [(node, depth)]
+
+    while stack:
+        current, level_depth = stack.pop()
+        indent = "  " * level_depth
+        role = current.get("role", "generic")
+
+        # Text nodes
+        if role == "text":
+            content = current.get("content", "")
+            if content:
+                lines.append(f"{indent}- text: {content}\n")
+            continue
+
+        name = current.get("name")
+        ref_id = current.get("ref")
+        url = current.get("url")
+        children = current.get("children", [])
+
+        # Build line: - role "name" [ref=eN] [extra]
+        line = f"{indent}- {role}"
+        if name:
+            line += f' "{name}"'
+        if ref_id:
+            line += f" [ref={ref_id}]"
+
+        level = current.get("level")
+        if level is not None:
+            line += f" [level={level}]"
+        checked = current.get("checked")
+        if checked is not None:
+            line += f" [checked={'true' if checked else 'false'}]"
+        value = current.get("value")
+        if value:
+            line += f' [value="{value}"]'
+
+        if children or url:
+            line += ":"
+        lines.append(line + "\n")
+
+        # URL for links
+        if url:
+            lines.append(f"{indent}  - /url: {url}\n")
+
+        # Children — pushed in reverse so they pop in document order.
+        child_depth = level_depth + 1
+        stack.extend((child, child_depth) for child in reversed(children))
+
+    return "".join(lines)
 
 
 def _handle_snapshot(
@@ -516,9 +605,10 @@ def _handle_snapshot(
     """Capture an accessibility-tree snapshot of the current page.
 
     Returns a structured text representation of all interactive and content
-    elements with ref identifiers that can be used as selectors.
+    elements with ref identifiers that can be used as selectors. The worker
+    returns its cached result when the DOM has not changed since the last call.
     """
-    result = page.evaluate(_SNAPSHOT_JS)
+    result = page.snapshot(_SNAPSHOT_JS)
     tree = result.get("tree") if isinstance(result, dict) else None
     ref_count = result.get("refCount", 0) if isinstance(result, dict) else 0
 
@@ -556,6 +646,7 @@ _HANDLERS: dict[str, _HandlerFn] = {
     "go_forward": _handle_go_forward,
     "reload": _handle_reload,
     "snapshot": _handle_snapshot,
+    "screenshot": _handle_screenshot,
 }
 
 
@@ -686,6 +777,18 @@ def _pre_validate(action: str, params: dict[str, Any]) -> str | None:
     elif action == "wait":
         if not selector:
             return "Error: 'selector' is required for action 'wait'."
+    elif action == "screenshot":
+        image_format = (params.get("image_format") or "png").strip().lower()
+        if image_format not in _SCREENSHOT_MIME_TYPES:
+            return f"Error: 'image_format' must be 'png' or 'jpeg'. Got: '{image_format}'"
+        if image_format == "jpeg":  # quality is ignored for png
+            raw_quality = params.get("quality")
+            try:
+                quality = _parse_quality(raw_quality)
+            except (TypeError, ValueError):
+                quality = 0
+            if quality is not None and not 1 <= quality <= 100:
+                return f"Error: 'quality' must be an integer from 1 to 100. Got: '{raw_quality}'"
     return None
 
 
@@ -746,7 +849,7 @@ class BrowserOperatorTool(Tool):
         # Strategy:
         # 1) Prefer existing pooled session_id connection
         # 2) If missing/unhealthy and cdp_url exists, reconnect the pool for this session_id
-        # 3) If only cdp_url exists, create an ephemeral pooled connection for this call
+        # 3) If only cdp_url exists, use the pooled connection shared by that cdp_url
         if session_id:
             # Snapshot provider metadata *before* get_page(), because
             # ConnectionUnhealthy evicts the connection (and its metadata)
@@ -797,17 +900,19 @@ class BrowserOperatorTool(Tool):
                 )
                 return
 
-        # cdp_url-only mode: one operation in an ephemeral pooled session.
+        # cdp_url-only mode: reuse one pooled worker per cdp_url across calls,
+        # so its interpreter, Playwright driver and CDP attach are paid once.
+        # The pool drops idle shared workers after a short TTL.
         # This avoids direct sync Playwright calls in the current runtime thread.
-        ephemeral_session_id = f"ephemeral-{uuid.uuid4()}"
+        shared_session_id = _cdp_session_id(cdp_url)
         try:
-            pool.connect(ephemeral_session_id, cdp_url)
-            page = pool.get_page(ephemeral_session_id)
+            page = pool.get_or_connect(shared_session_id, cdp_url)
             yield from handler(self, page, tool_parameters)
         except Exception as e:
             logger.error("browser_operator action failed.")
+            if isinstance(e, (ConnectionNotFound, ConnectionUnhealthy)):
+                # Only a broken worker is dropped; other callers may share it.
+                pool.disconnect(shared_session_id)
             yield self.create_text_message(
                 f"Error: Action '{action}' failed: {type(e).__name__}: {e}"
             )
-        finally:
-            pool.disconnect(ephemeral_session_id)
@@ -7,16 +7,25 @@ in a dedicated child Python process (utils/playwright_worker.py).
 """
 
 import atexit
+import base64
 import json
 import logging
 import subprocess
 import sys
 import threading
 import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, suppress
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - declared dependency; stdlib json fallback
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -32,7 +41,13 @@ class WorkerTimeoutError(Exception):
     """Raised when a worker operation times out (maps to PlaywrightTimeout)."""
 
 
+class PageLoadTimeoutError(Exception):
+    """Raised when a committed navigation never reached DOMContentLoaded."""
+
+
 class _KeyboardProxy:
+    __slots__ = ("_worker",)
+
     def __init__(self, worker: "_SubprocessWorker") -> None:
         self._worker = worker
 
@@ -43,6 +58,8 @@ class _KeyboardProxy:
 class _PooledPageProxy:
     """Playwright Page-like proxy backed by a subprocess worker."""
 
+    __slots__ = ("_worker", "keyboard")
+
     def __init__(self, worker: "_SubprocessWorker") -> None:
         self._worker = worker
         self.keyboard = _KeyboardProxy(worker)
@@ -109,10 +126,153 @@ class _PooledPageProxy:
     def evaluate(self, expression: str) -> Any:
         return self._worker.call("evaluate", {"expression": expression})
 
+    def screenshot(self, image_type: str = "png", quality: int | None = None) -> bytes:
+        # Image bytes cross the JSONL pipe base64-encoded; callers get raw bytes.
+        encoded = self._worker.call("screenshot", {"type": image_type, "quality": quality})
+        return base64.b64decode(encoded)
+
+    def ping(self) -> Any:
+        # Health probe; unlike evaluate() it leaves the worker's read cache intact.
+        return self._worker.call("ping", {})
+
+    def snapshot(self, expression: str) -> Any:
+        """Evaluate a snapshot expression; the worker reuses its cached result."""
+        return self._worker.call("snapshot", {"expression": expression})
+
+
+_WORKER_SCRIPT = Path(__file__).with_name("playwright_worker.py")
+_STANDBY_FLAG = "--standby"
+_STANDBY_WORKERS = 1
+# A standby is an extra interpreter plus Playwright driver against the
+# plugin's memory limit (manifest.yaml), so it only outlives the last
+# session start by this long; the stale sweep releases it after that.
+_STANDBY_MAX_IDLE_SECONDS = 120
+
+
+def _spawn_worker(args: list[str]) -> subprocess.Popen[bytes]:
+    return subprocess.Popen(
+        [sys.executable, str(_WORKER_SCRIPT), *args],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _send_connect(proc: subprocess.Popen[bytes], ws_endpoint: str, timeout_ms: int) -> bool:
+    """Hand a CDP endpoint to a standby worker. Returns False if its pipe is gone."""
+    if proc.stdin is None:
+        return False
+    try:
+        proc.stdin.write(_encode_line({
+            "id": 0,
+            "op": "connect",
+            "params": {"ws_endpoint": ws_endpoint, "timeout_ms": timeout_ms},
+        }))
+        proc.stdin.flush()
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def _terminate_process(proc: subprocess.Popen[bytes]) -> None:
+    """Best-effort shutdown of a worker process that never joined the pool."""
+    with suppress(Exception):
+        if proc.stdin is not None:
+            proc.stdin.close()  # standby workers exit on stdin EOF
+    try:
+        proc.terminate()
+        proc.wait(timeout=3)
+    except Exception:
+        with suppress(Exception):
+            proc.kill()
+
+
+class _StandbyWorkers:
+    """Pre-started worker processes waiting to be attached to a session.
+
+    Starting the interpreter and the Playwright driver dominates connect
+    latency. A standby worker has already paid that cost, so handing one out
+    leaves only the CDP attach on the critical path. The pool is refilled in
+    the background after each hand-out; nothing is spawned until first use,
+    and ``release_if_idle()`` gives the processes back once no session has
+    started for a while.
+    """
+
+    def __init__(self, size: int = _STANDBY_WORKERS) -> None:
+        self._size = size
+        self._procs: list[subprocess.Popen[bytes]] = []
+        self._lock = threading.Lock()
+        self._refilling = False
+        self._closed = False
+        # Bumped by release(); a refill started before it discards its spawn.
+        self._generation = 0
+        # time.monotonic() of the last session start (see replenish()).
+        self._last_demand = 0.0
+
+    def take(self) -> subprocess.Popen[bytes] | None:
+        with self._lock:
+            while self._procs:
+                proc = self._procs.pop()
+                if proc.poll() is None:
+                    return proc
+        return None
+
+    def replenish(self) -> None:
+        # Called on every session start, so it also marks demand.
+        with self._lock:
+            self._last_demand = time.monotonic()
+            if self._closed or self._refilling or len(self._procs) >= self._size:
+                return
+            self._refilling = True
+        t = threading.Thread(target=self._fill, daemon=True, name="pool-standby")
+        t.start()
+
+    def _fill(self) -> None:
+        try:
+            while True:
+                with self._lock:
+                    if self._closed or len(self._procs) >= self._size:
+                        return
+                    generation = self._generation
+                proc = _spawn_worker([_STANDBY_FLAG])
+                with self._lock:
+                    if not self._closed and generation == self._generation:
+                        self._procs.append(proc)
+                        continue
+                _terminate_process(proc)
+                return
+        except Exception:
+            logger.debug("Pool: failed to start standby worker", exc_info=True)
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def release(self) -> None:
+        """Stop the idle standbys; the next hand-out refills as usual."""
+        with self._lock:
+            self._generation += 1
+            procs, self._procs = self._procs, []
+        _run_concurrently(_terminate_process, procs)
+
+    def release_if_idle(self, max_idle: float) -> None:
+        """Release the standbys if no session has started for *max_idle* s."""
+        with self._lock:
+            if not self._procs or time.monotonic() - self._last_demand < max_idle:
+                return
+        self.release()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            procs, self._procs = self._procs, []
+        _run_concurrently(_terminate_process, procs)
+
 
 class _SubprocessWorker:
     """Owns a single Playwright session in a child process."""
 
+    __slots__ = ("_session_id", "_timeout_ms", "_next_id", "_io_lock", "_proc")
+
     def __init__(self, session_id: str, ws_endpoint: str, timeout_ms: int = 30000) -> None:
         self._session_id = session_id
         self._timeout_ms = timeout_ms
@@ -121,22 +281,16 @@ class _SubprocessWorker:
         self._proc = self._start_worker(ws_endpoint, timeout_ms)
         self._handshake()
 
-    def _start_worker(self, ws_endpoint: str, timeout_ms: int) -> subprocess.Popen[str]:
-        worker_script = Path(__file__).with_name("playwright_worker.py")
-        cmd = [
-            sys.executable,
-            str(worker_script),
-            ws_endpoint,
-            str(timeout_ms),
-        ]
-        return subprocess.Popen(
-            cmd,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            text=True,
-            bufsize=1,
-        )
+    def _start_worker(self, ws_endpoint: str, timeout_ms: int) -> subprocess.Popen[bytes]:
+        # Prefer a pre-started standby worker; it only needs the CDP target.
+        proc = _standby.take()
+        if proc is not None and not _send_connect(proc, ws_endpoint, timeout_ms):
+            _terminate_process(proc)
+            proc = None
+        if proc is None:
+            proc = _spawn_worker([ws_endpoint, str(timeout_ms)])
+        _standby.replenish()
+        return proc
 
     def _handshake(self) -> None:
         resp = self._read_response_line()
@@ -156,10 +310,22 @@ class _SubprocessWorker:
             self._next_id += 1
             payload = {"id": req_id, "op": op, "params": params}
             self._write_payload(payload)
-            resp = self._read_response_line()
+            line = self._read_line()
+        # Parse outside the lock: large snapshot / screenshot payloads are
+        # decoded while the next caller's request is already in flight.
+        resp = self._parse_line(line)
 
         if not resp.get("ok"):
             error = resp.get("error") or "worker command failed"
+            if error.startswith("TargetLostError: "):
+                # The worker lost its browser or page and is exiting.
+                raise ConnectionUnhealthy(
+                    f"Browser page lost for session '{self._session_id}': "
+                    f"{error.removeprefix('TargetLostError: ')}"
+                )
+            # Checked first: the deferred load wait is not an element timeout.
+            if error.startswith("PageLoadTimeoutError: "):
+                raise PageLoadTimeoutError(error.removeprefix("PageLoadTimeoutError: "))
             # Detect Playwright timeout errors so callers can handle them
             # distinctly from other failures (e.g. show "element not found"
             # hints instead of generic errors).
@@ -201,10 +367,19 @@ class _SubprocessWorker:
     def _write_payload(self, payload: dict[str, Any]) -> None:
         if self._proc.stdin is None:
             raise ConnectionUnhealthy(f"Worker stdin unavailable for session '{self._session_id}'.")
-        self._proc.stdin.write(json.dumps(payload, ensure_ascii=False) + "\n")
-        self._proc.stdin.flush()
+        try:
+            self._proc.stdin.write(_encode_line(payload))
+            self._proc.stdin.flush()
+        except (OSError, ValueError) as exc:
+            # The worker exited (e.g. after losing its browser or page).
+            raise ConnectionUnhealthy(
+                f"Browser worker closed pipe for session '{self._session_id}'."
+            ) from exc
 
     def _read_response_line(self) -> dict[str, Any]:
+        return self._parse_line(self._read_line())
+
+    def _read_line(self) -> bytes:
         if self._proc.stdout is None:
             raise ConnectionUnhealthy(f"Worker stdout unavailable for session '{self._session_id}'.")
 
@@ -213,15 +388,40 @@ class _SubprocessWorker:
             raise ConnectionUnhealthy(
                 f"Browser worker closed pipe for session '{self._session_id}'."
             )
+        return line
+
+    def _parse_line(self, line: bytes) -> dict[str, Any]:
         try:
-            return json.loads(line)
+            return _decode_line(line)
         except json.JSONDecodeError as exc:
             raise ConnectionUnhealthy(
-                f"Invalid worker response for session '{self._session_id}': {line[:200]}"
+                f"Invalid worker response for session '{self._session_id}': "
+                f"{line[:200].decode(errors='replace')}"
             ) from exc
 
 
-@dataclass
+def _encode_line(payload: dict[str, Any]) -> bytes:
+    """Serialize one JSONL message (orjson when available).
+
+    Worker pipes are binary, so orjson's UTF-8 output is written as-is.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload) + b"\n"
+    return json.dumps(payload, ensure_ascii=False).encode() + b"\n"
+
+
+def _decode_line(line: bytes) -> Any:
+    """Parse one JSONL message (orjson when available).
+
+    ``orjson.JSONDecodeError`` subclasses ``json.JSONDecodeError``, so callers
+    handle both decoders with the same except clause.
+    """
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+@dataclass(slots=True)
 class ManagedConnection:
     """A cached worker-backed CDP connection."""
 
@@ -229,7 +429,8 @@ class ManagedConnection:
     page: _PooledPageProxy
     session_id: str
     ws_endpoint: str
-    provider_name: str = "hyperbrowser"
+    # None for connections that own no provider session (a raw CDP endpoint).
+    provider_name: str | None = "hyperbrowser"
     api_key: str = ""
     created_at: float = field(default_factory=time.time)
     last_used_at: float = field(default_factory=time.time)
@@ -240,19 +441,45 @@ class ManagedConnection:
 
 _DEFAULT_MAX_IDLE_SECONDS = 1800
 _DEFAULT_MAX_POOL_SIZE = 20
-_CLEANUP_INTERVAL_SECONDS = 300
+_CLEANUP_INTERVAL_SECONDS = 60
+# A full pool may evict a least-recently-used connection that owns no
+# provider session and has been idle at least this long; otherwise connect()
+# is rejected. Provider sessions are never evicted for space: their cached
+# provider metadata is what browser_stop_session needs to release the
+# remote (billed) browser.
+_EVICT_MIN_IDLE_SECONDS = 30
+# Connections without a provider session (shared per-cdp_url workers) are
+# cheap to re-create, so the stale sweep drops them after this much idle time
+# instead of the pool-wide max_idle_seconds.
+_SHARED_MAX_IDLE_SECONDS = 120
+
+
+class _SessionLock:
+    """A per-session lock and the number of callers holding or awaiting it."""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.users = 0
 
 
 class ConnectionPool:
-    """Thread-safe pool of live browser workers keyed by session_id."""
+    """Thread-safe pool of live browser workers keyed by session_id.
+
+    Connections are kept in least-recently-used order (oldest first), which
+    lets the idle sweep and pool-full eviction stop at the first fresh entry.
+    """
 
     def __init__(
         self,
         max_idle_seconds: float = _DEFAULT_MAX_IDLE_SECONDS,
         max_size: int = _DEFAULT_MAX_POOL_SIZE,
     ) -> None:
-        self._connections: dict[str, ManagedConnection] = {}
+        self._connections: OrderedDict[str, ManagedConnection] = OrderedDict()
         self._lock = threading.Lock()
+        # See _session_guard().
+        self._session_locks: dict[str, _SessionLock] = {}
         self._max_idle_seconds = max_idle_seconds
         self._max_size = max_size
         self._start_cleanup_thread()
@@ -269,15 +496,51 @@ class ConnectionPool:
         t = threading.Thread(target=_loop, daemon=True, name="pool-cleanup")
         t.start()
 
+    @contextmanager
+    def _session_guard(self, session_id: str) -> Iterator[None]:
+        """Serialize connect / health-check work for one session_id.
+
+        The pool-wide ``_lock`` only guards the dict; slow per-session work
+        (worker spawn, CDP attach, health check) runs under this lock so
+        different sessions proceed concurrently. Entries are refcounted and
+        dropped once unused, so ids of closed sessions do not accumulate.
+        """
+        with self._lock:
+            entry = self._session_locks.get(session_id)
+            if entry is None:
+                entry = self._session_locks[session_id] = _SessionLock()
+            entry.users += 1
+        try:
+            with entry.lock:
+                yield
+        finally:
+            with self._lock:
+                entry.users -= 1
+                if entry.users == 0:
+                    del self._session_locks[session_id]
+
     def connect(
         self,
         session_id: str,
         ws_endpoint: str,
         timeout_ms: int = 30000,
-        provider_name: str = "hyperbrowser",
+        provider_name: str | None = "hyperbrowser",
         api_key: str = "",
     ) -> _PooledPageProxy:
-        # Spawn worker outside the lock (expensive I/O operation).
+        with self._session_guard(session_id):
+            return self._connect_locked(
+                session_id, ws_endpoint, timeout_ms, provider_name, api_key,
+            )
+
+    def _connect_locked(
+        self,
+        session_id: str,
+        ws_endpoint: str,
+        timeout_ms: int,
+        provider_name: str | None,
+        api_key: str,
+    ) -> _PooledPageProxy:
+        # Spawn worker outside the pool lock (expensive I/O operation).
         worker = _SubprocessWorker(
             session_id=session_id,
             ws_endpoint=ws_endpoint,
@@ -294,31 +557,59 @@ class ConnectionPool:
         )
 
         evicted_conn: ManagedConnection | None = None
+        lru_conn: ManagedConnection | None = None
+        pool_full = False
         with self._lock:
             # Evict any existing connection for this session_id (under lock).
             evicted_conn = self._connections.pop(session_id, None)
 
             if len(self._connections) >= self._max_size:
-                # Kill the just-spawned worker before raising.
-                worker.stop()
-                raise RuntimeError(
-                    f"Connection pool is full ({self._max_size} sessions). "
-                    "Stop an existing session before creating a new one."
-                )
+                lru_conn = self._pop_idle_lru()
+                pool_full = lru_conn is None
+            if not pool_full:
+                self._connections[session_id] = conn
 
-            self._connections[session_id] = conn
-
-        # Stop evicted worker outside lock to avoid deadlock.
+        # Stop workers outside the lock: stop() may block for seconds.
         if evicted_conn is not None:
             _stop_worker_safely(evicted_conn.worker)
             logger.info("Pool: evicted previous connection for session")
+        if lru_conn is not None:
+            _stop_worker_safely(lru_conn.worker)
+            logger.info("Pool: evicted least-recently-used idle session")
+        if pool_full:
+            # Kill the just-spawned worker before raising.
+            worker.stop()
+            raise RuntimeError(
+                f"Connection pool is full ({self._max_size} sessions). "
+                "Stop an existing session before creating a new one."
+            )
 
         logger.info("Pool: connected session")
         return page
 
+    def get_or_connect(
+        self, session_id: str, ws_endpoint: str, timeout_ms: int = 30000,
+    ) -> _PooledPageProxy:
+        """Return the pooled page for *session_id*, (re)connecting if needed.
+
+        Lookup and connect run under one session guard, so concurrent callers
+        sharing a session_id attach a single worker instead of evicting each
+        other's.
+        """
+        with self._session_guard(session_id):
+            try:
+                return self._get_page_locked(session_id)
+            except (ConnectionNotFound, ConnectionUnhealthy):
+                # A raw CDP endpoint: no provider session to stop later.
+                return self._connect_locked(session_id, ws_endpoint, timeout_ms, None, "")
+
     _HEALTH_CHECK_INTERVAL = 30.0  # seconds idle before running a health check
 
     def get_page(self, session_id: str) -> _PooledPageProxy:
+        with self._session_guard(session_id):
+            return self._get_page_locked(session_id)
+
+    def _get_page_locked(self, session_id: str) -> _PooledPageProxy:
         with self._lock:
             conn = self._connections.get(session_id)
             if conn is None:
@@ -336,7 +627,7 @@ class ConnectionPool:
         )
         if needs_check:
             try:
-                conn.page.evaluate("1")
+                conn.page.ping()
             except Exception as exc:
                 # Remove from pool under lock, stop worker outside lock.
                 with self._lock:
@@ -348,9 +639,22 @@ class ConnectionPool:
                     f"Pooled connection for session '{session_id}' is dead: {exc}"
                 ) from exc
 
-        conn.touch()
+        with self._lock:
+            if self._connections.get(session_id) is conn:
+                self._connections.move_to_end(session_id)
+            conn.touch()
         return conn.page
 
+    def _pop_idle_lru(self) -> ManagedConnection | None:
+        """Pop the LRU idle connection without a provider session (lock held)."""
+        now = time.time()
+        for session_id, conn in self._connections.items():
+            if now - conn.last_used_at < _EVICT_MIN_IDLE_SECONDS:
+                break  # LRU order: every later entry is fresher
+            if conn.provider_name is None:
+                return self._connections.pop(session_id)
+        return None
+
     def disconnect(self, session_id: str) -> None:
         with self._lock:
             conn = self._connections.pop(session_id, None)
@@ -365,24 +669,29 @@ class ConnectionPool:
         with self._lock:
             conns = list(self._connections.values())
             self._connections.clear()
-        # Stop all workers outside lock.
-        for conn in conns:
-            _stop_worker_safely(conn.worker)
+        # Stop all workers outside lock, concurrently.
+        _run_concurrently(_stop_worker_safely, [conn.worker for conn in conns])
         logger.info("Pool: disconnected all sessions")
 
     def cleanup_stale(self) -> None:
         now = time.time()
+        shared_max_idle = min(self._max_idle_seconds, _SHARED_MAX_IDLE_SECONDS)
         with self._lock:
-            stale = [
-                sid
-                for sid, conn in self._connections.items()
-                if (now - conn.last_used_at) > self._max_idle_seconds
-            ]
+            stale = []
+            # Oldest first: stop at the first connection fresh under the
+            # shorter (shared) limit; every later one is fresher still.
+            for sid, conn in self._connections.items():
+                idle = now - conn.last_used_at
+                if idle <= shared_max_idle:
+                    break
+                if conn.provider_name is None or idle > self._max_idle_seconds:
+                    stale.append(sid)
             stale_conns = [self._connections.pop(sid) for sid in stale]
         # Stop stale workers outside lock.
-        for conn in stale_conns:
-            logger.info("Pool: cleaning up stale session")
-            _stop_worker_safely(conn.worker)
+        if stale_conns:
+            logger.info("Pool: cleaning up %d stale session(s)", len(stale_conns))
+            _run_concurrently(_stop_worker_safely, [conn.worker for conn in stale_conns])
+        _standby.release_if_idle(_STANDBY_MAX_IDLE_SECONDS)
 
     @property
     def size(self) -> int:
@@ -393,7 +702,7 @@ class ConnectionPool:
         with self._lock:
             return session_id in self._connections
 
-    def get_session_info(self, session_id: str) -> tuple[str, str] | None:
+    def get_session_info(self, session_id: str) -> tuple[str | None, str] | None:
         """Return (provider_name, api_key) cached at create time, or None."""
         with self._lock:
             conn = self._connections.get(session_id)
@@ -416,5 +725,34 @@ def _stop_worker_safely(worker: _SubprocessWorker) -> None:
         )
 
 
+def _run_concurrently(fn: Callable[[Any], None], items: list[Any]) -> None:
+    """Apply *fn* to every item in parallel threads and wait for all of them.
+
+    Used for worker shutdown: each stop can block for seconds in
+    ``Popen.wait``, so stopping N workers overlaps instead of adding up.
+    Items whose thread cannot be started run inline instead: from Python
+    3.12 ``Thread.start()`` raises RuntimeError inside atexit handlers,
+    which is where ``disconnect_all`` runs at shutdown.
+    """
+    started: list[threading.Thread] = []
+    inline = items if len(items) <= 1 else []
+    if not inline:
+        for i, item in enumerate(items):
+            t = threading.Thread(target=fn, args=(item,), daemon=True, name="pool-stop")
+            try:
+                t.start()
+            except RuntimeError:
+                inline = items[i:]
+                break
+            started.append(t)
+    for item in inline:
+        fn(item)
+    for t in started:
+        t.join()
+
+
+_standby = _StandbyWorkers()
+atexit.register(_standby.shutdown)
+
 pool = ConnectionPool()
 atexit.register(pool.disconnect_all)
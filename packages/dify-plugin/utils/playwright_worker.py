@@ -2,26 +2,71 @@
 
 Runs outside Dify's patched runtime and executes browser operations over JSONL.
 
+Launched either directly with ``<ws_endpoint> <timeout_ms>``, or as a standby
+(``--standby``) that starts Playwright up front and waits for a ``connect``
+message carrying the endpoint.
+
 Supports three selector formats (matching actionbook CLI behavior):
   - CSS selectors: ".btn", "#submit", "button:has-text('OK')"
   - XPath selectors: "//button[text()='Submit']"
-  - Snapshot refs: "@e5" or "[ref=e5]" (resolved via DOM re-walk)
+  - Snapshot refs: "@e5" or "[ref=e5]" (resolved via the element recorded by
+    the last snapshot, falling back to a DOM re-walk)
+
+Snapshots are memoized per DOM version (see ``_ReadCache``) so that repeated
+snapshots of an unchanged page skip the full DOM walk. The
+element finder and the snapshot script are registered as init scripts, so
+every document has them before its own scripts run, and are then invoked by
+name (see ``_evaluate_with_finder`` / ``_evaluate_installed``).
 """
 
 from __future__ import annotations
 
+import base64
+import contextlib
 import json
 import re
+import secrets
 import sys
+import time
+from collections.abc import Callable
 from typing import Any
 
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from playwright.sync_api import sync_playwright
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - declared dependency; stdlib json fallback
+    orjson = None
+
 # Matches @eN or [ref=eN] snapshot reference selectors.
 _REF_RE = re.compile(r"^(?:@e(\d+)|\[ref=e(\d+)\])$")
 
+# First characters a ref / XPath selector can start with. Checking one char
+# rejects ordinary CSS selectors (".btn", "#id", "button") before any regex.
+_JS_SELECTOR_FIRST_CHARS = frozenset("@[/(")
+
+# All in-page helper state (finder, DOM token, snapshot refs, installed
+# scripts) lives on one window property with a random per-worker name,
+# defined non-writable, non-enumerable and non-configurable, so page globals
+# cannot collide with or replace it. This is not isolation: the helpers run
+# in the page's main world, where scripts can still find the property (e.g.
+# via Object.getOwnPropertyNames) and change the holder's fields.
+_HOLDER_NAME = "_" + secrets.token_hex(8)
+_HOLDER_NAME_JSON = json.dumps(_HOLDER_NAME)
+
+# Expression returning the holder, creating it on first use in a document.
+_HOLDER_JS = f"""(() => {{
+    const d = Object.getOwnPropertyDescriptor(window, {_HOLDER_NAME_JSON});
+    if (d) return d.value;
+    const h = {{ find: null, token: null, refs: [], scripts: new Map() }};
+    Object.defineProperty(window, {_HOLDER_NAME_JSON}, {{ value: h }});
+    return h;
+}})()"""
+
 # JavaScript that defines __findElement(selector).
 # Ported from actionbook CLI session.rs — supports CSS, XPath, and @eN refs.
+# Expects the helper holder in scope as ``__abHolder``.
 _FIND_ELEMENT_JS = r"""
 function __findElement(selector) {
     // Normalize [ref=eN] format to @eN
@@ -29,58 +74,55 @@ function __findElement(selector) {
     if (refMatch) selector = '@' + refMatch[1];
     if (/^@e\d+$/.test(selector)) {
         const targetNum = parseInt(selector.slice(2));
+        // Fast path: the element recorded for this ref by the last snapshot.
+        // It is the exact node the caller saw, even if the DOM shifted since.
+        const known = __abHolder.refs[targetNum];
+        if (known && known.isConnected) return known;
         const SKIP_TAGS = new Set(['script','style','noscript','template','svg','path','defs','clippath','lineargradient','stop','meta','link','br','wbr']);
         const INLINE_TAGS = new Set(['strong','b','em','i','code','span','small','sup','sub','abbr','mark','u','s','del','ins','time','q','cite','dfn','var','samp','kbd']);
         const INTERACTIVE_ROLES = new Set(['button','link','textbox','checkbox','radio','combobox','listbox','menuitem','menuitemcheckbox','menuitemradio','option','searchbox','slider','spinbutton','switch','tab','treeitem']);
         const CONTENT_ROLES = new Set(['heading','cell','gridcell','columnheader','rowheader','listitem','article','region','main','navigation','img']);
-        function getRole(el) {
+        const TAG_ROLES = {'button':'button','select':'combobox','textarea':'textbox','img':'img',
+            'h1':'heading','h2':'heading','h3':'heading','h4':'heading','h5':'heading','h6':'heading',
+            'nav':'navigation','main':'main','header':'banner','footer':'contentinfo','aside':'complementary',
+            'form':'form','table':'table','thead':'rowgroup','tbody':'rowgroup','tfoot':'rowgroup',
+            'tr':'row','th':'columnheader','td':'cell','ul':'list','ol':'list','li':'listitem',
+            'details':'group','summary':'button','dialog':'dialog','article':'article'};
+        const INPUT_ROLES = {'text':'textbox','email':'textbox','password':'textbox','search':'searchbox','tel':'textbox','url':'textbox','number':'spinbutton','checkbox':'checkbox','radio':'radio','submit':'button','reset':'button','button':'button','range':'slider'};
+        const HEADING_TAGS = new Set(['h1','h2','h3','h4','h5','h6']);
+        function getRole(el, tag) {
             const explicit = el.getAttribute('role');
             if (explicit) return explicit.toLowerCase();
-            const tag = el.tagName.toLowerCase();
             if (INLINE_TAGS.has(tag)) return tag;
-            const roleMap = {
-                'a': el.hasAttribute('href') ? 'link' : 'generic',
-                'button': 'button', 'input': getInputRole(el), 'select': 'combobox', 'textarea': 'textbox', 'img': 'img',
-                'h1':'heading','h2':'heading','h3':'heading','h4':'heading','h5':'heading','h6':'heading',
-                'nav':'navigation','main':'main','header':'banner','footer':'contentinfo','aside':'complementary',
-                'form':'form','table':'table','thead':'rowgroup','tbody':'rowgroup','tfoot':'rowgroup',
-                'tr':'row','th':'columnheader','td':'cell','ul':'list','ol':'list','li':'listitem',
-                'details':'group','summary':'button','dialog':'dialog',
-                'section': el.hasAttribute('aria-label') || el.hasAttribute('aria-labelledby') ? 'region' : 'generic',
-                'article':'article'
-            };
-            return roleMap[tag] || 'generic';
-        }
-        function getInputRole(el) {
-            const type = (el.getAttribute('type') || 'text').toLowerCase();
-            const map = {'text':'textbox','email':'textbox','password':'textbox','search':'searchbox','tel':'textbox','url':'textbox','number':'spinbutton','checkbox':'checkbox','radio':'radio','submit':'button','reset':'button','button':'button','range':'slider'};
-            return map[type] || 'textbox';
+            if (tag === 'a') return el.hasAttribute('href') ? 'link' : 'generic';
+            if (tag === 'input') return INPUT_ROLES[(el.getAttribute('type') || 'text').toLowerCase()] || 'textbox';
+            if (tag === 'section') return el.hasAttribute('aria-label') || el.hasAttribute('aria-labelledby') ? 'region' : 'generic';
+            return TAG_ROLES[tag] || 'generic';
         }
-        function getAccessibleName(el) {
+        function getAccessibleName(el, tag) {
             const ariaLabel = el.getAttribute('aria-label');
             if (ariaLabel) return ariaLabel.trim();
             const labelledBy = el.getAttribute('aria-labelledby');
             if (labelledBy) { const label = document.getElementById(labelledBy); if (label) return label.textContent?.trim()?.substring(0, 100) || ''; }
-            const tag = el.tagName.toLowerCase();
             if (tag === 'img') return el.getAttribute('alt') || '';
             if (tag === 'input' || tag === 'textarea' || tag === 'select') {
                 if (el.id) { const label = document.querySelector('label[for="' + el.id + '"]'); if (label) return label.textContent?.trim()?.substring(0, 100) || ''; }
                 return el.getAttribute('placeholder') || el.getAttribute('title') || '';
             }
             if (tag === 'a' || tag === 'button' || tag === 'summary') return '';
-            if (['h1','h2','h3','h4','h5','h6'].includes(tag)) return el.textContent?.trim()?.substring(0, 150) || '';
+            if (HEADING_TAGS.has(tag)) return el.textContent?.trim()?.substring(0, 150) || '';
             const title = el.getAttribute('title');
             if (title) return title.trim();
             return '';
         }
-        function isHidden(el) {
+        function isHidden(el, tag) {
             if (el.hidden) return true;
             if (el.getAttribute('aria-hidden') === 'true') return true;
             const style = el.style;
             if (style.display === 'none' || style.visibility === 'hidden') return true;
-            if (el.offsetParent === null && el.tagName.toLowerCase() !== 'body' && getComputedStyle(el).position !== 'fixed' && getComputedStyle(el).position !== 'sticky') {
+            if (el.offsetParent === null && tag !== 'body') {
                 const cs = getComputedStyle(el);
-                if (cs.display === 'none' || cs.visibility === 'hidden') return true;
+                if (cs.position !== 'fixed' && cs.position !== 'sticky' && (cs.display === 'none' || cs.visibility === 'hidden')) return true;
             }
             return false;
         }
@@ -89,9 +131,9 @@ function __findElement(selector) {
             if (depth > 15) return null;
             const tag = el.tagName.toLowerCase();
             if (SKIP_TAGS.has(tag)) return null;
-            if (isHidden(el)) return null;
-            const role = getRole(el);
-            const name = getAccessibleName(el);
+            if (isHidden(el, tag)) return null;
+            const role = getRole(el, tag);
+            const name = getAccessibleName(el, tag);
             const isInteractive = INTERACTIVE_ROLES.has(role);
             const isContent = CONTENT_ROLES.has(role);
             const shouldRef = isInteractive || (isContent && name);
@@ -116,20 +158,281 @@ function __findElement(selector) {
 """
 
 
-def _is_ref_selector(selector: str) -> bool:
-    """Check if a selector is a snapshot ref (@eN or [ref=eN])."""
-    return bool(_REF_RE.match(selector.strip()))
+# Statement block that installs __findElement on the holder (and leaves it
+# in scope for any code that follows).
+_INSTALL_FINDER_JS = (
+    f"const __abHolder = {_HOLDER_JS};\n"
+    + _FIND_ELEMENT_JS
+    + "\n__abHolder.find = __findElement;\n"
+)
+
+# Returned by the short per-call scripts when the current document has no
+# helper installed. Init scripts make this rare (e.g. a document that was
+# already loading when the script was registered).
+_NOT_INSTALLED = "__ab_not_installed__"
+
+
+def _install_finder(page) -> None:
+    """Install the finder in every document of *page*, current one included.
+
+    The init script runs in each new document before the page's own
+    scripts, so the per-call scripts below normally find the finder on the
+    first try instead of paying a miss round trip.
+    """
+    script = "(function() {\n" + _INSTALL_FINDER_JS + "})()"
+    page.add_init_script(script=script)
+    # May fail mid-navigation; a later miss then installs it on demand.
+    with contextlib.suppress(Exception):
+        page.evaluate(script)
+
+
+def _evaluate_with_finder(page, body: str) -> Any:
+    """Evaluate *body* (an IIFE body that may call ``__findElement``).
+
+    The finder already lives on the helper holder (see ``_install_finder``),
+    so calls ship only *body*; a document without it gets it on demand.
+    """
+    result = page.evaluate(
+        "(function() {\n"
+        f"const __abHolder = window[{_HOLDER_NAME_JSON}];\n"
+        "const __findElement = __abHolder && __abHolder.find;\n"
+        f"if (!__findElement) return {json.dumps(_NOT_INSTALLED)};\n"
+        + body
+        + "\n})()"
+    )
+    if result != _NOT_INSTALLED:
+        return result
+    return page.evaluate("(function() {\n" + _INSTALL_FINDER_JS + body + "\n})()")
+
+
+# JavaScript function (holder -> token) returning a DOM version token for the
+# current document. The token combines a per-document random id (new document
+# => new id), a counter bumped by a MutationObserver, and a hash of form
+# control values / checked states: those are IDL properties the observer
+# never sees, yet snapshots report them (and page JS may rewrite them).
+_DOM_TOKEN_FN_JS = r"""(h) => {
+    if (!h.token) {
+        const docId = Math.random().toString(36).slice(2);
+        let version = 0;
+        const observer = new MutationObserver(() => { version++; });
+        observer.observe(document, {
+            subtree: true, childList: true, attributes: true, characterData: true
+        });
+        h.token = function() {
+            if (observer.takeRecords().length) version++;
+            let form = 0;
+            for (const el of document.querySelectorAll('input, textarea, select')) {
+                const v = el.checked ? '\u0001' + el.value : el.value;
+                for (let i = 0; i < v.length; i++) form = (form * 31 + v.charCodeAt(i)) | 0;
+                form = (form * 31 + 1) | 0;
+            }
+            return docId + ':' + version + ':' + form;
+        };
+    }
+    return h.token();
+}"""
+
+# Returned by a snapshot evaluate when the DOM token still equals the one the
+# caller passed in, i.e. its cached result is current.
+_UNCHANGED = "__ab_unchanged__"
+
+
+def _define_script_js(script_id: int, expression: str) -> str:
+    """Statements storing *expression* as closure ``f`` in the holder's script map."""
+    return (
+        f"const __abHolder = {_HOLDER_JS};\n"
+        f"const f = () => ({expression});\n"
+        f"__abHolder.scripts.set({script_id}, f);\n"
+    )
+
+
+def _define_and_run_js(script_id: int, expression: str) -> str:
+    # Token first: if the DOM changes later, the next call sees a newer token.
+    return (
+        "(function() {\n"
+        + _define_script_js(script_id, expression)
+        + f"const token = ({_DOM_TOKEN_FN_JS})(__abHolder);\n"
+        "return { token, result: f() };\n"
+        "})()"
+    )
+
+
+def _register_script(page, script_id: int, expression: str) -> dict[str, Any]:
+    """Install *expression* for every later document and run it in this one.
+
+    Returns ``{"token", "result"}`` like ``_evaluate_installed``.
+    """
+    page.add_init_script(
+        script="(function() {\n" + _define_script_js(script_id, expression) + "})()",
+    )
+    return page.evaluate(_define_and_run_js(script_id, expression))
+
+
+def _evaluate_installed(
+    page, script_id: int, expression: str, token: str | None,
+) -> Any:
+    """Evaluate a large, fixed *expression* via its closure in the holder.
+
+    ``_register_script`` put the closure into every document, so calls just
+    invoke it and V8 does not receive and parse the full source each time.
+    The DOM token check rides along: the reply is ``_UNCHANGED`` when the
+    page's token still equals *token*, else ``{"token", "result"}``. A
+    document without the closure gets it installed on demand.
+    """
+    reply = page.evaluate(
+        "(cached) => {\n"
+        f"const h = window[{_HOLDER_NAME_JSON}];\n"
+        f"const f = h && h.scripts.get({script_id});\n"
+        f"if (!f) return {json.dumps(_NOT_INSTALLED)};\n"
+        f"const token = ({_DOM_TOKEN_FN_JS})(h);\n"
+        f"if (token === cached) return {json.dumps(_UNCHANGED)};\n"
+        "return { token, result: f() };\n"
+        "}",
+        token,
+    )
+    if reply != _NOT_INSTALLED:
+        return reply
+    return page.evaluate(_define_and_run_js(script_id, expression))
+
+
+# Ops that may change page state the DOM token cannot see (focus, hover
+# styles, navigation). They drop the cached snapshots up front.
+_MUTATING_OPS = frozenset({
+    "goto", "click", "type", "fill", "select_option", "keyboard_press", "hover",
+    "go_back", "go_forward", "reload", "evaluate",
+})
+
+
+class _ReadCache:
+    """Memoizes snapshot results per DOM version.
+
+    Entries are keyed by snapshot expression and share one DOM token; all are
+    dropped as soon as the token changes or ``invalidate()`` is called.
+    """
+
+    _MAX_ENTRIES = 16
+
+    def __init__(self) -> None:
+        self._token: str | None = None
+        self._values: dict[str, Any] = {}
+
+    def invalidate(self) -> None:
+        self._token = None
+        self._values.clear()
+
+    def get(self, key: str, compute: Callable[[str | None], Any]) -> Any:
+        """Return the value for *key*, recomputing unless the DOM is unchanged.
+
+        ``compute(token)`` runs in the page in one round trip: it returns
+        ``_UNCHANGED`` if the page's DOM token equals *token*, else
+        ``{"token", "result"}``. *token* is None when nothing is cached for
+        *key*, so there is no separate probe that could only miss.
+        """
+        reply = compute(self._token if key in self._values else None)
+        if reply == _UNCHANGED:
+            return self._values[key]
+        token = reply["token"]
+        if token != self._token or len(self._values) >= self._MAX_ENTRIES:
+            self._values.clear()
+        self._token = token
+        self._values[key] = reply["result"]
+        return reply["result"]
+
+
+# Ops that start a new navigation (or wait for one) and so supersede any
+# pending load wait, and ops that never touch the document.
+_NAVIGATION_OPS = frozenset({
+    "goto", "go_back", "go_forward", "reload", "wait_for_load_state",
+})
+_DOCUMENT_FREE_OPS = frozenset({"close", "url", "ping"})
+
+
+class PageLoadTimeoutError(Exception):
+    """A commit-only navigation did not reach DOMContentLoaded in time.
+
+    Kept distinct from Playwright's TimeoutError so the pool does not report
+    it as a missing element.
+    """
+
+
+class TargetLostError(Exception):
+    """The browser disconnected or the worker's page closed.
+
+    The worker exits after replying with it, and the pool maps it to
+    ConnectionUnhealthy, so the next attach picks a live page instead of the
+    worker answering every op with a target-closed error.
+    """
+
+
+class _LoadGate:
+    """Defers the DOMContentLoaded wait of a commit-only navigation.
+
+    ``goto(wait_until="commit")`` returns as soon as the response starts
+    arriving, so the caller is not blocked while the page renders. The first
+    later op that reads or drives the document waits for DOMContentLoaded
+    here instead (a no-op if the page is already that far).
+    """
+
+    def __init__(self) -> None:
+        self._pending = False
+        self._timeout: float | None = None
+        self._started_at = 0.0
+
+    def arm(self, timeout: float | None, started_at: float) -> None:
+        """Arm for a navigation begun at *started_at* (``time.monotonic()``).
+
+        *timeout* (ms) is the navigation's whole budget, so the later wait
+        only gets what the commit itself did not use.
+        """
+        self._pending = True
+        self._timeout = timeout
+        self._started_at = started_at
+
+    def clear(self) -> None:
+        self._pending = False
+
+    def wait(self, page) -> None:
+        if not self._pending:
+            return
+        self._pending = False
+        timeout = self._timeout
+        if timeout:  # None / 0 keep Playwright's default / no-timeout meaning
+            elapsed_ms = (time.monotonic() - self._started_at) * 1000
+            # At least 1 ms: an already-loaded page still passes immediately.
+            timeout = max(1.0, timeout - elapsed_ms)
+        try:
+            page.wait_for_load_state("domcontentloaded", timeout=timeout)
+        except PlaywrightTimeoutError as exc:
+            budget = (
+                f"{self._timeout:.0f} ms" if self._timeout else "Playwright's default timeout"
+            )
+            raise PageLoadTimeoutError(
+                f"Page did not reach DOMContentLoaded within {budget} of navigation start"
+            ) from exc
 
 
 def _is_js_selector(selector: str) -> bool:
     """Check if a selector needs JS-based resolution (ref or XPath)."""
     s = selector.strip()
-    return _is_ref_selector(s) or s.startswith("//") or s.startswith("(//")
+    if s[:1] not in _JS_SELECTOR_FIRST_CHARS:
+        return False
+    return bool(_REF_RE.match(s)) or s.startswith(("//", "(//"))
 
 
 def _send(payload: dict[str, Any]) -> None:
-    sys.stdout.write(json.dumps(payload, ensure_ascii=False) + "\n")
-    sys.stdout.flush()
+    # The pool talks to us over binary pipes; write UTF-8 bytes directly.
+    if orjson is not None:
+        data = orjson.dumps(payload)
+    else:
+        data = json.dumps(payload, ensure_ascii=False).encode()
+    sys.stdout.buffer.write(data + b"\n")
+    sys.stdout.buffer.flush()
+
+
+def _decode_request(line: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
 
 
 def _result(req_id: int, value: Any) -> None:
@@ -158,16 +461,13 @@ def _js_click(page, selector: str) -> None:
     """Click via JS element resolution + coordinate-based mouse click."""
     sel_json = json.dumps(selector)
     js = (
-        "(function() {\n"
-        + _FIND_ELEMENT_JS
-        + f"\nconst el = __findElement({sel_json});\n"
+        f"const el = __findElement({sel_json});\n"
         "if (!el) return null;\n"
         "el.scrollIntoView({ behavior: 'instant', block: 'center', inline: 'center' });\n"
         "const rect = el.getBoundingClientRect();\n"
         "return { x: rect.left + rect.width / 2, y: rect.top + rect.height / 2 };\n"
-        "})()"
     )
-    coords = page.evaluate(js)
+    coords = _evaluate_with_finder(page, js)
     if coords is None:
         raise ValueError(f"Element not found for selector: {selector}")
     page.mouse.click(coords["x"], coords["y"])
@@ -178,18 +478,15 @@ def _js_fill(page, selector: str, text: str) -> None:
     sel_json = json.dumps(selector)
     text_json = json.dumps(text)
     js = (
-        "(function() {\n"
-        + _FIND_ELEMENT_JS
-        + f"\nconst el = __findElement({sel_json});\n"
+        f"const el = __findElement({sel_json});\n"
         "if (!el) return false;\n"
         "el.focus();\n"
         f"el.value = {text_json};\n"
         "el.dispatchEvent(new Event('input', { bubbles: true }));\n"
         "el.dispatchEvent(new Event('change', { bubbles: true }));\n"
         "return true;\n"
-        "})()"
     )
-    ok = page.evaluate(js)
+    ok = _evaluate_with_finder(page, js)
     if not ok:
         raise ValueError(f"Element not found for selector: {selector}")
 
@@ -198,15 +495,12 @@ def _js_type(page, selector: str, text: str) -> None:
     """Type via JS element resolution — focus then use keyboard."""
     sel_json = json.dumps(selector)
     js = (
-        "(function() {\n"
-        + _FIND_ELEMENT_JS
-        + f"\nconst el = __findElement({sel_json});\n"
+        f"const el = __findElement({sel_json});\n"
         "if (!el) return false;\n"
         "el.focus();\n"
         "return true;\n"
-        "})()"
     )
-    ok = page.evaluate(js)
+    ok = _evaluate_with_finder(page, js)
     if not ok:
         raise ValueError(f"Element not found for selector: {selector}")
     page.keyboard.type(text)
@@ -216,16 +510,13 @@ def _js_hover(page, selector: str) -> None:
     """Hover via JS element resolution + coordinate-based mouse move."""
     sel_json = json.dumps(selector)
     js = (
-        "(function() {\n"
-        + _FIND_ELEMENT_JS
-        + f"\nconst el = __findElement({sel_json});\n"
+        f"const el = __findElement({sel_json});\n"
         "if (!el) return null;\n"
         "el.scrollIntoView({ behavior: 'instant', block: 'center', inline: 'center' });\n"
         "const rect = el.getBoundingClientRect();\n"
         "return { x: rect.left + rect.width / 2, y: rect.top + rect.height / 2 };\n"
-        "})()"
     )
-    coords = page.evaluate(js)
+    coords = _evaluate_with_finder(page, js)
     if coords is None:
         raise ValueError(f"Element not found for selector: {selector}")
     page.mouse.move(coords["x"], coords["y"])
@@ -236,9 +527,7 @@ def _js_select_option(page, selector: str, value: str) -> list[str]:
     sel_json = json.dumps(selector)
     val_json = json.dumps(value)
     js = (
-        "(function() {\n"
-        + _FIND_ELEMENT_JS
-        + f"\nconst el = __findElement({sel_json});\n"
+        f"const el = __findElement({sel_json});\n"
         "if (!el || el.tagName.toLowerCase() !== 'select') return null;\n"
         f"const val = {val_json};\n"
         "for (const opt of el.options) {\n"
@@ -249,41 +538,254 @@ def _js_select_option(page, selector: str, value: str) -> list[str]:
         "  }\n"
         "}\n"
         "return [];\n"
-        "})()"
     )
-    result = page.evaluate(js)
+    result = _evaluate_with_finder(page, js)
     if result is None:
         raise ValueError(f"Element not found for selector: {selector}")
     return result
 
 
-def _js_wait_for_selector(page, selector: str, timeout: float | None) -> None:
-    """Wait until a JS-resolved selector appears, honoring timeout."""
+def _js_read_property(page, selector: str, prop: str) -> str:
+    """Read innerText / innerHTML of a JS-resolved element."""
     sel_json = json.dumps(selector)
     js = (
+        f"const el = __findElement({sel_json});\n"
+        "if (!el) return null;\n"
+        f"return el.{prop};\n"
+    )
+    result = _evaluate_with_finder(page, js)
+    if result is None:
+        raise ValueError(f"Element not found for selector: {selector}")
+    return result
+
+
+def _js_wait_for_selector(page, selector: str, timeout: float | None) -> None:
+    """Wait until a JS-resolved selector appears, honoring timeout.
+
+    The polled predicate only calls the installed finder. In the rare
+    document without one the predicate resolves with the not-installed
+    marker; the finder is installed and the wait resumes with the remaining
+    budget.
+    """
+    sel_json = json.dumps(selector)
+    predicate = (
         "(function() {\n"
-        + _FIND_ELEMENT_JS
-        + f"\nreturn __findElement({sel_json}) !== null;\n"
+        f"const h = window[{_HOLDER_NAME_JSON}];\n"
+        f"if (!h || !h.find) return {json.dumps(_NOT_INSTALLED)};\n"
+        f"return h.find({sel_json}) !== null;\n"
         "})()"
     )
-    page.wait_for_function(js, timeout=timeout)
+    started_at = time.monotonic()
+    remaining = timeout
+    while True:
+        handle = page.wait_for_function(predicate, timeout=remaining)
+        if handle.json_value() != _NOT_INSTALLED:
+            return
+        page.evaluate("(function() {\n" + _INSTALL_FINDER_JS + "})()")
+        if timeout:  # None / 0 keep Playwright's default / no-timeout meaning
+            remaining = max(1.0, timeout - (time.monotonic() - started_at) * 1000)
+
+
+class _Session:
+    """Per-worker state handed to every op handler."""
+
+    __slots__ = ("page", "reads", "load_gate", "script_ids")
+
+    def __init__(self, page) -> None:
+        self.page = page
+        self.reads = _ReadCache()
+        self.load_gate = _LoadGate()
+        # Expression source -> id of its closure in the holder's script map.
+        self.script_ids: dict[str, int] = {}
+
+
+def _op_goto(s: _Session, params: dict[str, Any]) -> None:
+    started_at = time.monotonic()
+    s.page.goto(
+        params["url"],
+        timeout=params.get("timeout"),
+        wait_until=params.get("wait_until"),
+    )
+    if params.get("wait_until") == "commit":
+        s.load_gate.arm(params.get("timeout"), started_at)
+
+
+def _op_wait_for_selector(s: _Session, params: dict[str, Any]) -> None:
+    selector = params["selector"]
+    if _is_js_selector(selector):
+        _js_wait_for_selector(s.page, selector, timeout=params.get("timeout"))
+    else:
+        s.page.wait_for_selector(selector, timeout=params.get("timeout"))
+
+
+def _op_click(s: _Session, params: dict[str, Any]) -> None:
+    selector = params["selector"]
+    if _is_js_selector(selector):
+        _js_click(s.page, selector)
+    else:
+        s.page.click(selector)
+
+
+def _op_type(s: _Session, params: dict[str, Any]) -> None:
+    selector = params["selector"]
+    if _is_js_selector(selector):
+        _js_type(s.page, selector, params["text"])
+    else:
+        s.page.type(selector, params["text"])
+
+
+def _op_fill(s: _Session, params: dict[str, Any]) -> None:
+    selector = params["selector"]
+    if _is_js_selector(selector):
+        _js_fill(s.page, selector, params["text"])
+    else:
+        s.page.fill(selector, params["text"])
+
+
+def _op_select_option(s: _Session, params: dict[str, Any]) -> list[str]:
+    selector = params["selector"]
+    if _is_js_selector(selector):
+        return _js_select_option(s.page, selector, params["value"])
+    return s.page.select_option(selector, value=params["value"])
+
+
+def _op_hover(s: _Session, params: dict[str, Any]) -> None:
+    selector = params["selector"]
+    if _is_js_selector(selector):
+        _js_hover(s.page, selector)
+    else:
+        s.page.hover(selector)
+
+
+def _read_element(s: _Session, op: str, prop: str, selector: str) -> str:
+    """Element read; refs / XPath resolve through the JS finder.
+
+    Not cached: the DOM token would cost a round trip of its own, and it
+    misses shadow-tree changes that Playwright's CSS engine can see.
+    """
+    if _is_js_selector(selector):
+        return _js_read_property(s.page, selector, prop)
+    return getattr(s.page, op)(selector)
+
+
+def _op_inner_text(s: _Session, params: dict[str, Any]) -> str:
+    return _read_element(s, "inner_text", "innerText", params["selector"])
+
+
+def _op_inner_html(s: _Session, params: dict[str, Any]) -> str:
+    return _read_element(s, "inner_html", "innerHTML", params["selector"])
+
+
+def _op_wait_for_load_state(s: _Session, params: dict[str, Any]) -> None:
+    s.page.wait_for_load_state(params["state"], timeout=params.get("timeout"))
+
+
+def _op_go_back(s: _Session, params: dict[str, Any]) -> None:
+    s.page.go_back()
+
+
+def _op_go_forward(s: _Session, params: dict[str, Any]) -> None:
+    s.page.go_forward()
+
+
+def _op_reload(s: _Session, params: dict[str, Any]) -> None:
+    s.page.reload(wait_until=params.get("wait_until"))
+
+
+def _op_screenshot(s: _Session, params: dict[str, Any]) -> str:
+    options: dict[str, Any] = {"type": params.get("type") or "png"}
+    if options["type"] == "jpeg" and params.get("quality") is not None:
+        options["quality"] = int(params["quality"])
+    data = s.page.screenshot(**options)
+    # base64 output is pure ASCII; the ASCII codec skips UTF-8 validation.
+    return base64.b64encode(data).decode("ascii")
+
+
+def _op_snapshot(s: _Session, params: dict[str, Any]) -> Any:
+    expression = params["expression"]
+    script_id = s.script_ids.get(expression)
+    if script_id is None:
+        # First use in this worker: register it for later documents too.
+        def compute(token: str | None) -> Any:
+            new_id = len(s.script_ids)
+            reply = _register_script(s.page, new_id, expression)
+            s.script_ids[expression] = new_id
+            return reply
+    else:
+        def compute(token: str | None) -> Any:
+            return _evaluate_installed(s.page, script_id, expression, token)
+    return s.reads.get(expression, compute)
+
+
+# Op name -> handler. A handler's return value is sent back as the result.
+_OPS: dict[str, Callable[[_Session, dict[str, Any]], Any]] = {
+    "url": lambda s, params: s.page.url,
+    "title": lambda s, params: s.page.title(),
+    "goto": _op_goto,
+    "wait_for_selector": _op_wait_for_selector,
+    "click": _op_click,
+    "type": _op_type,
+    "fill": _op_fill,
+    "select_option": _op_select_option,
+    "keyboard_press": lambda s, params: s.page.keyboard.press(params["key"]),
+    "hover": _op_hover,
+    "inner_text": _op_inner_text,
+    "inner_html": _op_inner_html,
+    "content": lambda s, params: s.page.content(),
+    "wait_for_load_state": _op_wait_for_load_state,
+    "go_back": _op_go_back,
+    "go_forward": _op_go_forward,
+    "reload": _op_reload,
+    "evaluate": lambda s, params: s.page.evaluate(params["expression"]),
+    # Pool health probe: a round-trip into the page that is neither gated on
+    # a pending load nor treated as a mutation.
+    "ping": lambda s, params: s.page.evaluate("1"),
+    "screenshot": _op_screenshot,
+    "snapshot": _op_snapshot,
+}
+
+
+def _read_connect_request() -> tuple[str, float] | None:
+    """Block until the pool hands this standby worker a CDP endpoint.
+
+    Returns None if stdin closes first (the pool shut down the standby).
+    """
+    for line in sys.stdin.buffer:
+        line = line.strip()
+        if not line:
+            continue
+        params = _decode_request(line).get("params") or {}
+        return params["ws_endpoint"], float(params["timeout_ms"])
+    return None
 
 
 def main() -> int:
-    if len(sys.argv) < 3:
-        _send({"ok": False, "error": "Usage: playwright_worker.py <ws_endpoint> <timeout_ms>"})
+    standby = sys.argv[1:] == ["--standby"]
+    if not standby and len(sys.argv) < 3:
+        _send({
+            "ok": False,
+            "error": "Usage: playwright_worker.py (<ws_endpoint> <timeout_ms> | --standby)",
+        })
         return 2
 
-    ws_endpoint = sys.argv[1]
-    timeout_ms = float(sys.argv[2])
-
     pw = None
     browser = None
     page = None
     try:
         pw = sync_playwright().start()
+        if standby:
+            # Driver is up; wait for a session before connecting.
+            target = _read_connect_request()
+            if target is None:
+                pw.stop()
+                return 0
+            ws_endpoint, timeout_ms = target
+        else:
+            ws_endpoint = sys.argv[1]
+            timeout_ms = float(sys.argv[2])
         browser = pw.chromium.connect_over_cdp(ws_endpoint, timeout=timeout_ms)
         page = _get_active_page(browser)
+        _install_finder(page)
         _send({"ok": True, "ready": True})
     except BaseException as exc:
         _send({"ok": False, "error": f"{type(exc).__name__}: {exc}"})
@@ -301,13 +803,19 @@ def main() -> int:
 
     assert page is not None
 
+    session = _Session(page)
+    page.on(
+        "framenavigated",
+        lambda frame: session.reads.invalidate() if frame == page.main_frame else None,
+    )
+
     try:
-        for line in sys.stdin:
+        for line in sys.stdin.buffer:
             line = line.strip()
             if not line:
                 continue
             try:
-                payload = json.loads(line)
+                payload = _decode_request(line)
             except json.JSONDecodeError as exc:
                 _send({"ok": False, "error": f"JSONDecodeError: {exc}"})
                 continue
@@ -316,101 +824,25 @@ def main() -> int:
             op = payload.get("op")
             params = payload.get("params") or {}
 
+            if op in _MUTATING_OPS:
+                session.reads.invalidate()
+
             try:
                 if op == "close":
                     _result(req_id, "closing")
                     break
-                if op == "url":
-                    _result(req_id, page.url)
-                elif op == "title":
-                    _result(req_id, page.title())
-                elif op == "goto":
-                    page.goto(
-                        params["url"],
-                        timeout=params.get("timeout"),
-                        wait_until=params.get("wait_until"),
-                    )
-                    _result(req_id, None)
-                elif op == "wait_for_selector":
-                    selector = params["selector"]
-                    if _is_js_selector(selector):
-                        _js_wait_for_selector(
-                            page,
-                            selector,
-                            timeout=params.get("timeout"),
-                        )
-                    else:
-                        page.wait_for_selector(
-                            selector,
-                            timeout=params.get("timeout"),
-                        )
-                    _result(req_id, None)
-                elif op == "click":
-                    selector = params["selector"]
-                    if _is_js_selector(selector):
-                        _js_click(page, selector)
-                    else:
-                        page.click(selector)
-                    _result(req_id, None)
-                elif op == "type":
-                    selector = params["selector"]
-                    if _is_js_selector(selector):
-                        _js_type(page, selector, params["text"])
-                    else:
-                        page.type(selector, params["text"])
-                    _result(req_id, None)
-                elif op == "fill":
-                    selector = params["selector"]
-                    if _is_js_selector(selector):
-                        _js_fill(page, selector, params["text"])
-                    else:
-                        page.fill(selector, params["text"])
-                    _result(req_id, None)
-                elif op == "select_option":
-                    selector = params["selector"]
-                    if _is_js_selector(selector):
-                        _result(req_id, _js_select_option(page, selector, params["value"]))
-                    else:
-                        _result(
-                            req_id,
-                            page.select_option(selector, value=params["value"]),
-                        )
-                elif op == "keyboard_press":
-                    page.keyboard.press(params["key"])
-                    _result(req_id, None)
-                elif op == "hover":
-                    selector = params["selector"]
-                    if _is_js_selector(selector):
-                        _js_hover(page, selector)
-                    else:
-                        page.hover(selector)
-                    _result(req_id, None)
-                elif op == "inner_text":
-                    _result(req_id, page.inner_text(params["selector"]))
-                elif op == "inner_html":
-                    _result(req_id, page.inner_html(params["selector"]))
-                elif op == "content":
-                    _result(req_id, page.content())
-                elif op == "wait_for_load_state":
-                    page.wait_for_load_state(
-                        params["state"],
-                        timeout=params.get("timeout"),
-                    )
-                    _result(req_id, None)
-                elif op == "go_back":
-                    page.go_back()
-                    _result(req_id, None)
-                elif op == "go_forward":
-                    page.go_forward()
-                    _result(req_id, None)
-                elif op == "reload":
-                    page.reload(wait_until=params.get("wait_until"))
-                    _result(req_id, None)
-                elif op == "evaluate":
-                    _result(req_id, page.evaluate(params["expression"]))
-                else:
+                handler = _OPS.get(op)
+                if handler is None:
                     raise ValueError(f"Unknown op: {op}")
+                if op in _NAVIGATION_OPS:
+                    session.load_gate.clear()
+                elif op not in _DOCUMENT_FREE_OPS:
+                    session.load_gate.wait(page)
+                _result(req_id, handler(session, params))
             except BaseException as exc:
+                if not browser.is_connected() or page.is_closed():
+                    _error(req_id, TargetLostError(f"{type(exc).__name__}: {exc}"))
+                    break
                 _error(req_id, exc)
     finally:
         try: